@@ -0,0 +1,369 @@
+"""Replay gateway events into the bot's handlers against a fake Discord API.
+
+Feeds MESSAGE_REACTION_ADD/REMOVE and INTERACTION_CREATE payloads through the
+bot's own gateway parsers, so dispatch, the reaction handlers and the slash
+command tree all run as they would live. Every REST call is answered by a fake
+that counts calls per route and enforces per-route rate-limit buckets.
+
+    # 2,000 users reacting to a tracked announcement within ten seconds
+    python benchmarks/gateway_replay.py --users 2000 --seconds 10 --time-scale 0.01
+
+    # 200 /events invocations in one second
+    python benchmarks/gateway_replay.py --command events --users 200 --seconds 1
+
+    # Recorded payloads, one {"at": seconds, "t": event, "d": data} per line
+    python benchmarks/gateway_replay.py --replay burst.jsonl
+
+Replayed payloads should use the first guild in guilds.json. All sleeps (fake
+API latency and rate-limit waits) are multiplied by --time-scale, and the
+reported times are divided by it again. At small scales, CPU time is overstated
+in the simulated latencies by the same factor.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+os.environ.pop("GITHUB_TOKEN", None)  # Never touch the real data repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context  # noqa: E402
+
+import core  # noqa: E402
+import main  # noqa: E402
+
+BOT_USER_ID = 10**17
+CHANNEL_ID = 10**17 + 1
+MESSAGE_ID = 10**17 + 2
+FIRST_USER_ID = 2 * 10**17
+
+
+class FakeDiscord:
+    """Answers routes with canned payloads, counting calls and rate-limit waits."""
+
+    def __init__(self, time_scale, latency, buckets):
+        self.time_scale = time_scale
+        self.latency = latency
+        self.buckets = buckets  # route template -> (requests, per seconds)
+        self.tat = {}  # (route template, major id) -> theoretical arrival time
+        self.calls = {}
+        self.waits = 0
+        self.waited = 0.0
+
+    async def request(self, route, **kwargs):
+        key = f"{route.method} {route.path}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        await self.take_token(key, route.major_parameters)
+        await asyncio.sleep(self.latency * self.time_scale)
+        return self.respond(route)
+
+    async def take_token(self, key, major):
+        """Wait for a slot in the route's bucket (GCRA, so waiters are served in order)."""
+        if key not in self.buckets:
+            return
+        size, per = self.buckets[key]
+        interval = per * self.time_scale / size
+        burst = per * self.time_scale - interval
+        now = time.perf_counter()
+        tat = max(self.tat.get((key, major), now), now)
+        self.tat[(key, major)] = tat + interval
+        wait = tat - burst - now
+        if wait > 0:
+            self.waits += 1
+            self.waited += wait / self.time_scale
+            await asyncio.sleep(wait)
+
+    def respond(self, route):
+        if route.path.endswith("/callback"):
+            return {"interaction": {"id": str(route.webhook_id), "type": 2}}
+        if route.path.endswith("/reactions/{emoji}"):
+            return [user_payload(BOT_USER_ID, bot=True)]
+        if route.path == "/channels/{channel_id}/messages/{message_id}":
+            return message_payload()
+        if route.path.startswith("/webhooks/"):
+            return message_payload()
+        return None
+
+
+class FakeWebhookAdapter(AsyncWebhookAdapter):
+
+    def __init__(self, fake):
+        super().__init__()
+        self.fake = fake
+
+    async def request(self, route, session=None, **kwargs):
+        return await self.fake.request(route, **kwargs)
+
+
+def user_payload(user_id, bot=False):
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot
+    }
+
+
+def member_payload(user_id, role_ids=()):
+    return {
+        "user": user_payload(user_id),
+        "roles": [str(r) for r in role_ids],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0
+    }
+
+
+def message_payload():
+    return {
+        "id": str(MESSAGE_ID),
+        "channel_id": str(CHANNEL_ID),
+        "author": user_payload(BOT_USER_ID, bot=True),
+        "content": "",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+        "reactions": [{
+            "count": 1,
+            "me": True,
+            "emoji": {
+                "id": None,
+                "name": "✅"
+            }
+        }]
+    }
+
+
+def setup_guild(guild_id, staff_role_id, participant_role_id):
+    state = main.bot._connection
+    state.user = discord.ClientUser(state=state,
+                                    data=user_payload(BOT_USER_ID, bot=True))
+    roles = [{
+        "id": str(guild_id),
+        "name": "@everyone",
+        "permissions": "0",
+        "position": 0
+    }] + [{
+        "id": str(role_id),
+        "name": name,
+        "permissions": "0",
+        "position": 1
+    } for role_id, name in ((staff_role_id, "Staff"),
+                            (participant_role_id, "Participant")) if role_id]
+    guild = discord.Guild(data={
+        "id": str(guild_id),
+        "name": "replay",
+        "roles": roles,
+        "channels": [{
+            "id": str(CHANNEL_ID),
+            "type": 0,
+            "name": "events",
+            "position": 0,
+            "permission_overwrites": []
+        }],
+        "member_count": 0,
+    },
+                          state=state)
+    state._add_guild(guild)
+    return guild
+
+
+def synthetic_payloads(args, guild_id, staff_role_id):
+    """Yield (offset seconds, event name, data) spread evenly over args.seconds."""
+    step = args.seconds / max(1, args.users)
+    for i in range(args.users):
+        user_id = FIRST_USER_ID + i
+        if args.command:
+            yield i * step, "INTERACTION_CREATE", {
+                "id": str(3 * 10**17 + i),
+                "application_id": str(BOT_USER_ID),
+                "type": 2,
+                "token": f"token{i}",
+                "version": 1,
+                "guild_id": str(guild_id),
+                "channel_id": str(CHANNEL_ID),
+                "member": {
+                    **member_payload(user_id, [staff_role_id] if staff_role_id else []),
+                    "permissions": "8"
+                },
+                "data": {
+                    "id": str(4 * 10**17),
+                    "name": args.command,
+                    "type": 1,
+                    "options": json.loads(args.options)
+                },
+                "locale": "en-US",
+                "app_permissions": "8",
+                "entitlements": [],
+                "authorizing_integration_owners": {},
+                "context": 0,
+                "attachment_size_limit": 0,
+            }
+        else:
+            yield i * step, "MESSAGE_REACTION_ADD", {
+                "user_id": str(user_id),
+                "channel_id": str(CHANNEL_ID),
+                "message_id": str(MESSAGE_ID),
+                "guild_id": str(guild_id),
+                "emoji": {
+                    "id": None,
+                    "name": "✅"
+                },
+                "member": member_payload(user_id),
+                "burst": False,
+                "type": 0
+            }
+
+
+def recorded_payloads(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["at"], record["t"], record["d"]
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def replay(args):
+    await main.bot._async_setup_hook()
+    await main.bot.setup_hook()  # Loads the extensions
+    guild_id = next(iter(core.guild_configs))
+    config = core.guild_configs[guild_id]
+    staff_role_id = (config["staff_role_ids"] or [None])[0]
+    setup_guild(guild_id, staff_role_id, config["participant_role_id"])
+
+    state = core.guild_state(guild_id)
+    state.ledger = core.ParticipationLedger()
+    if not args.untracked:
+        state.ledger.track(MESSAGE_ID, {
+            "name": "Replay",
+            "creator_id": BOT_USER_ID,
+            "creator_name": "replay",
+            "day": "2024-01-01"
+        })
+    state.ledger_ready.set()
+
+    fake = FakeDiscord(args.time_scale, args.latency, {
+        "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}": (10, 10),
+        "DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}": (10, 10),
+        "GET /channels/{channel_id}/messages/{message_id}": (50, 1),
+    })
+    main.bot.http.request = fake.request
+    async_context.set(FakeWebhookAdapter(fake))
+
+    fed_at = {}
+    latencies = []
+
+    def timed(handler, key_of):
+
+        async def wrapper(*args):
+            try:
+                await handler(*args)
+            finally:
+                started = fed_at.pop(key_of(*args), None)
+                if started is not None:
+                    latencies.append(
+                        (time.perf_counter() - started) / fake.time_scale)
+
+        return wrapper
+
+    for event, kind in (("on_raw_reaction_add", "add"),
+                        ("on_raw_reaction_remove", "remove")):
+        listeners = main.bot.extra_events[event]
+        listeners[:] = [timed(listener, lambda p, kind=kind: (kind, p.user_id))
+                        for listener in listeners]
+    main.bot.tree._call = timed(main.bot.tree._call, lambda i: i.id)
+
+    payloads = (recorded_payloads(args.replay) if args.replay else
+                synthetic_payloads(args, guild_id, staff_role_id))
+    parsers = main.bot._connection.parsers
+    started = time.perf_counter()
+    fed = 0
+    for at, event, data in payloads:
+        delay = started + at * args.time_scale - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if event == "INTERACTION_CREATE":
+            key = int(data["id"])
+        else:
+            kind = "add" if event == "MESSAGE_REACTION_ADD" else "remove"
+            key = (kind, int(data["user_id"]))
+        fed_at[key] = time.perf_counter()
+        parsers[event](data)
+        fed += 1
+    fed_seconds = (time.perf_counter() - started) / args.time_scale
+
+    deadline = time.perf_counter() + args.timeout
+    while fed_at and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    # Let queued role work (e.g. the reconciler's worker) drain
+    while state.role_worker and not state.role_worker.done():
+        await asyncio.sleep(0.01)
+    total = (time.perf_counter() - started) / args.time_scale
+
+    latencies.sort()
+    report = [
+        f"Fed {fed} events in {fed_seconds:.2f}s, handled {len(latencies)} "
+        f"({len(fed_at)} unfinished) in {total:.2f}s",
+        f"Throughput: {len(latencies) / total:.1f} events/s",
+        f"Latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+        f"max {(latencies[-1] if latencies else 0) * 1000:.1f} ms",
+        f"REST calls: {sum(fake.calls.values())}",
+    ]
+    report += [
+        f"  {count:6d}  {key}"
+        for key, count in sorted(fake.calls.items(), key=lambda kv: -kv[1])
+    ]
+    report.append(f"Rate-limit waits: {fake.waits} ({fake.waited:.1f}s total)")
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000,
+                        help="synthetic events to generate")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="spread synthetic events over this long")
+    parser.add_argument("--command",
+                        help="replay this slash command instead of reactions")
+    parser.add_argument("--options", default="[]",
+                        help='command options as JSON, e.g. [{"name": "event", "type": 3, "value": "Replay"}]')
+    parser.add_argument("--replay", help="JSONL file of recorded payloads")
+    parser.add_argument("--untracked", action="store_true",
+                        help="react on a message the ledger doesn't track")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="fake API latency per call, in seconds")
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="wall seconds to wait for handlers to finish")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the bot's own output while replaying")
+    args = parser.parse_args()
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with quiet:
+            report = asyncio.run(replay(args))
+    print("\n".join(report))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,256 @@
+"""Fail over between two in-process replicas sharing a fake data repo.
+
+Each replica imports its own copy of core.py and the storage and scheduler
+extensions, so it holds its own lease state as a separate process would. Both
+run hold_lease against a GitHubLease on a fake store that enforces
+compare-and-swap. Then the leader is killed:
+
+    python benchmarks/lease_failover.py --ttl 1.0
+
+Checks that the two replicas never lead at the same time, and that only the
+leader schedules and announces events. One renewal fails on the way; the
+leader must keep its lease through it. It also checks that the follower takes
+over once the dead leader's lease (LEASE_TTL) runs out, not before, and
+announces both the event that fell due while nobody led and the events still
+to come. Exits non-zero if any check fails.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GUILD_ID = 1
+CHANNEL_ID = 2
+LEASE_FILE = "leader.json"
+
+
+def isolated(name):
+    return name == "core" or name == "cogs" or name.startswith("cogs.")
+
+
+class FakeStore:
+    """fetch_github_file / put_github_file over in-memory files, bumping the SHA per write."""
+
+    def __init__(self, files):
+        self.files = {path: [json.dumps(data), 0] for path, data in files.items()}
+        self.lock = threading.Lock()
+        self.fail_next = False  # Make the next lease read error out
+
+    def fetch_github_file(self, path, kind="read"):
+        with self.lock:
+            if path == LEASE_FILE and self.fail_next:
+                self.fail_next = False
+                raise RuntimeError("Failed to fetch leader.json: 502")
+            if path not in self.files:
+                return None, None
+            text, version = self.files[path]
+            return json.loads(text), f"sha{version}"
+
+    def put_github_file(self, path, data, sha, message, indent=4, kind="write"):
+        with self.lock:
+            current = self.files.get(path)
+            if (sha or None) != (f"sha{current[1]}" if current else None):
+                return None
+            version = current[1] + 1 if current else 0
+            self.files[path] = [json.dumps(data), version]
+            return f"sha{version}"
+
+
+class FakeChannel:
+
+    def __init__(self, replica):
+        self.id = CHANNEL_ID
+        self.replica = replica
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.replica.announced.append((embed.title, time.monotonic()))
+        return SimpleNamespace(id=len(self.replica.announced),
+                               add_reaction=self.add_reaction)
+
+    async def add_reaction(self, emoji):
+        pass
+
+
+class Replica:
+    """One bot process: its own core module, extensions, lease loop and guild state."""
+
+    def __init__(self, name, store, ttl):
+        self.name = name
+        self.closed = False
+        self.announced = []
+        self.changes = []  # leadership_change values dispatched
+        saved = {key: sys.modules.pop(key) for key in list(sys.modules) if isolated(key)}
+        try:
+            self.core = importlib.import_module("core")
+            self.storage = importlib.import_module("cogs.storage")
+            self.scheduler = importlib.import_module("cogs.scheduler")
+        finally:
+            for key in [key for key in sys.modules if isolated(key)]:
+                del sys.modules[key]
+            sys.modules.update(saved)
+
+        self.storage.fetch_github_file = store.fetch_github_file
+        self.storage.put_github_file = store.put_github_file
+        self.storage.REPLICA_ID = name
+        self.storage.LEASE_TTL = ttl
+        self.storage.LEASE_RENEW = ttl / 3
+        self.storage.bot = self.scheduler.bot = self
+        self.core.lease_backend = self.storage.GitHubLease(LEASE_FILE)
+        self.core.guild_configs.update(self.storage.load_guild_configs())
+        self.cogs = [self.storage.Storage(self), self.scheduler.Scheduler(self)]
+        self.channel = FakeChannel(self)
+        self.guild = SimpleNamespace(id=GUILD_ID,
+                                     get_channel=lambda channel_id: self.channel,
+                                     text_channels=[self.channel])
+        self.state = self.core.guild_state(GUILD_ID)
+
+    # The parts of discord.Client the lease loop and scheduler use
+    async def wait_until_ready(self):
+        pass
+
+    def is_closed(self):
+        return self.closed
+
+    def get_guild(self, guild_id):
+        return self.guild if guild_id == GUILD_ID else None
+
+    def get_cog(self, name):
+        return next((cog for cog in self.cogs if type(cog).__name__ == name), None)
+
+    def dispatch(self, event, *args):
+        if event == "leadership_change":
+            self.changes.append(args[0])
+        for cog in self.cogs:
+            handler = getattr(cog, f"on_{event}", None)
+            if handler:
+                asyncio.create_task(handler(*args))
+
+    def load_events(self):
+        self.core.set_events(self.state, self.storage.load_events(self.state))
+        self.state.events_loaded = True
+
+    def start(self):
+        self.lease_task = asyncio.create_task(self.storage.hold_lease())
+
+    def kill(self):
+        """Stop everything at once, as a crashed process would."""
+        self.closed = True
+        self.lease_task.cancel()
+        for task in self.state.scheduled_tasks.values():
+            task.cancel()
+
+    def leading(self):
+        return not self.closed and self.core.leading()
+
+
+async def run(args):
+    store = FakeStore({"guilds.json": {str(GUILD_ID): {}}})
+    a = Replica("replica-a", store, args.ttl)
+    b = Replica("replica-b", store, args.ttl)
+
+    now = datetime.now(tz=timezone.utc)
+    events = [{
+        "name": name,
+        "info": "Failover check",
+        "start_time": (now + timedelta(seconds=at)).isoformat(),
+        "started": False,
+        "creator": {"id": 1, "name": "host"},
+        "channel_id": CHANNEL_ID
+    } for name, at in (("before", args.ttl * 0.5),
+                       ("missed", args.ttl * 1.3),  # After the kill, before takeover
+                       ("after", args.ttl * 3.5))]
+    store.files[f"events/{GUILD_ID}.json"] = [json.dumps(events), 0]
+    for replica in (a, b):
+        replica.load_events()
+
+    failures = []
+    overlaps = 0
+    took_over_at = None
+    a.start()
+    await asyncio.sleep(0.05)
+    b.start()
+
+    started = time.monotonic()
+    killed_at = None
+    failed_renewal = False
+    while time.monotonic() - started < args.ttl * 5:
+        if a.leading() and b.leading():
+            overlaps += 1
+        if not failed_renewal and time.monotonic() - started >= args.ttl * 0.6:
+            store.fail_next = True
+            failed_renewal = True
+        if killed_at is None and time.monotonic() - started >= args.ttl * 1.2:
+            if b.state.scheduled_tasks:
+                failures.append("the follower scheduled announcements")
+            a.kill()
+            killed_at = time.monotonic()
+            lease_expires = json.loads(store.files[LEASE_FILE][0])["expires_at"]
+            expires_in = lease_expires - time.time()
+        if killed_at and took_over_at is None and b.leading():
+            took_over_at = time.monotonic()
+        await asyncio.sleep(0.01)
+    b.kill()
+
+    names = {replica.name: [title for title, _ in replica.announced]
+             for replica in (a, b)}
+    if overlaps:
+        failures.append(f"both replicas led at once ({overlaps} samples)")
+    if names["replica-a"] != ["BEFORE"]:
+        failures.append(f"the first leader announced {names['replica-a']}")
+    if a.changes != [True]:
+        failures.append(f"the first leader's leadership changes were {a.changes}")
+    if names["replica-b"] != ["MISSED", "AFTER"]:
+        failures.append(f"the new leader announced {names['replica-b']}")
+    if took_over_at is None:
+        failures.append("the follower never took over")
+    else:
+        after_kill = took_over_at - killed_at
+        if after_kill < expires_in - 0.05:
+            failures.append(
+                f"took over {after_kill:.2f}s after the kill, before the lease expired "
+                f"({expires_in:.2f}s)")
+        if after_kill > expires_in + args.ttl / 3 + 0.2:
+            failures.append(f"took over only {after_kill:.2f}s after the kill")
+
+    report = [
+        f"Lease TTL {args.ttl:.2f}s, renewed every {args.ttl / 3:.2f}s",
+        f"Announced by replica-a: {names['replica-a']}, by replica-b: {names['replica-b']}",
+        "replica-b took over "
+        + (f"{took_over_at - killed_at:.2f}s after the kill "
+           f"(lease had {expires_in:.2f}s left)" if took_over_at else "never"),
+    ]
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ttl", type=float, default=1.0,
+                        help="LEASE_TTL for both replicas, in seconds")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the replicas' own output")
+    args = parser.parse_args()
+    os.chdir(ROOT)
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with quiet:
+            report, failures = asyncio.run(run(args))
+    print("\n".join(report))
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ One leader at a time, and the follower took over after the TTL.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Compare member-cache memory with and without LEAN_MEMBER_CACHE.
+
+Builds a synthetic guild of N members (a fraction holding the Participant
+role) the way the gateway delivers it, without connecting to Discord:
+
+    python benchmarks/member_cache.py --members 100000 --participants 0.05
+
+Full mode caches a Member per user as chunking would. Lean mode runs
+load_participants from cogs/reactions.py, which pages through the members over
+REST (answered here by a fake) and keeps only the Participant user IDs.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+from cogs import reactions  # noqa: E402
+
+GUILD_ID = 1
+PARTICIPANT_ROLE_ID = 2
+
+
+def guild_payload():
+    return {
+        "id": str(GUILD_ID),
+        "name": "bench",
+        "roles": [{
+            "id": str(GUILD_ID),
+            "name": "@everyone",
+            "permissions": "0",
+            "position": 0
+        }, {
+            "id": str(PARTICIPANT_ROLE_ID),
+            "name": "Participant",
+            "permissions": "0",
+            "position": 1
+        }],
+        "member_count": 0,
+    }
+
+
+def member_payload(user_id, participant):
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": f"user{user_id}",
+            "discriminator": "0",
+            "global_name": f"User {user_id}",
+            "avatar": "a" * 32,
+        },
+        "roles": [str(PARTICIPANT_ROLE_ID)] if participant else [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def make_client(lean):
+    intents = discord.Intents.default()
+    intents.members = True
+    flags = discord.MemberCacheFlags.none() if lean else discord.MemberCacheFlags.from_intents(intents)
+    return discord.Client(intents=intents,
+                          member_cache_flags=flags,
+                          chunk_guilds_at_startup=not lean)
+
+
+def fake_get_members(members, every):
+    """GET /guilds/{guild.id}/members, answered with generated pages."""
+    first = 10**17
+
+    async def get_members(guild_id, limit, after):
+        start = max(first, (after or 0) + 1)
+        end = min(first + members, start + limit)
+        return [member_payload(user_id, user_id % every == 0)
+                for user_id in range(start, end)]
+
+    return get_members
+
+
+def run_lean(client, guild, members, every):
+    client._connection._add_guild(guild)
+    client._connection.http.get_members = fake_get_members(members, every)
+    reactions.bot = client
+    core.guild_configs[GUILD_ID] = core.with_defaults(
+        GUILD_ID, {"participant_role_id": PARTICIPANT_ROLE_ID})
+    state = core.guild_state(GUILD_ID)
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(reactions.load_participants(state))
+    return len(state.participant_ids)
+
+
+def run(lean, members, every):
+    client = make_client(lean)
+    state = client._connection
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    guild = discord.Guild(data=guild_payload(), state=state)
+    if lean:
+        holders = run_lean(client, guild, members, every)
+    else:
+        for user_id in range(10**17, 10**17 + members):
+            data = member_payload(user_id, user_id % every == 0)
+            # What GUILD_MEMBERS_CHUNK does for every member
+            guild._add_member(discord.Member(data=data, guild=guild, state=state))
+        holders = len(guild.get_role(PARTICIPANT_ROLE_ID).members)
+
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, elapsed, holders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--participants", type=float, default=0.05,
+                        help="fraction of members holding the Participant role")
+    args = parser.parse_args()
+    every = max(1, round(1 / args.participants))
+
+    print(f"{args.members} members, 1 in {every} holding Participant")
+    for name, lean in (("full", False), ("lean", True)):
+        current, peak, elapsed, holders = run(lean, args.members, every)
+        print(f"{name:>5}: retained {current / 2**20:8.2f} MiB, "
+              f"peak {peak / 2**20:8.2f} MiB, {elapsed:6.2f}s, "
+              f"{holders} participants")
+
+
+if __name__ == "__main__":
+    main()
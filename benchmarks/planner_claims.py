@@ -0,0 +1,195 @@
+"""Stress /claim and /unclaim against a fake data repo that enforces compare-and-swap.
+
+Runs many concurrent claims through cogs/planner.py's update_planner_week while
+a rival replica claims slots directly in the store and /eventplanner keeps
+refreshing the cached schedule, then checks the stored schedule:
+
+    python benchmarks/planner_claims.py --users 300 --weeks 4 --slots 40
+
+Every claim that reported success must be stored exactly once, nothing else
+may be, and at least one commit must have lost a race and been retried (the
+409 path). Exits non-zero if any check fails.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+from cogs import planner  # noqa: E402
+
+GUILD_ID = 1
+RIVAL_ID_BASE = 10**6  # User IDs claimed by the rival replica
+
+
+class FakeStore:
+    """The Storage cog's file helpers over one in-memory file, bumping the SHA per write."""
+
+    def __init__(self, schedule, latency):
+        self.text = json.dumps(schedule)
+        self.version = 0
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.conflicts = 0
+
+    def pause(self):
+        time.sleep(random.uniform(0, self.latency))
+
+    def fetch_github_file(self, path, kind="read"):
+        self.pause()
+        with self.lock:
+            return json.loads(self.text), f"sha{self.version}"
+
+    def put_github_file(self, path, data, sha, message, indent=4, kind="write"):
+        self.pause()
+        with self.lock:
+            if sha != f"sha{self.version}":
+                self.conflicts += 1
+                return None
+            self.text = json.dumps(data)
+            self.version += 1
+            self.writes += 1
+            return f"sha{self.version}"
+
+    def rival_claim(self, key, number, user_id):
+        """Another replica claiming a slot: read, modify and write in one step."""
+        with self.lock:
+            schedule = json.loads(self.text)
+            slots = schedule[key][number - 1]["slots"]
+            if None not in slots:
+                return False
+            slots[slots.index(None)] = {"id": user_id, "name": f"rival{user_id}"}
+            self.text = json.dumps(schedule)
+            self.version += 1
+            return True
+
+
+def seed_schedule(weeks, slots):
+    """This month and next, as ensure_schedule would create them, with wider weeks."""
+    today = date.today()
+    schedule = {}
+    for offset in (0, 1):
+        month = (today.month + offset - 1) % 12 + 1
+        year = today.year + (today.month + offset - 1) // 12
+        month_weeks = planner.generate_month(year, month)
+        for week in month_weeks:
+            week.update(capacity=slots, slots=[None] * slots)
+        schedule[planner.month_key(year, month)] = month_weeks
+    return schedule
+
+
+async def run(args):
+    core.guild_configs[GUILD_ID] = core.with_defaults(GUILD_ID, {})
+    state = core.guild_state(GUILD_ID)
+    store = FakeStore(seed_schedule(args.weeks, args.slots), args.latency)
+    planner.bot = SimpleNamespace(get_cog=lambda name: store)
+
+    schedule = await asyncio.to_thread(planner.ensure_schedule, state)
+    key = planner.find_week(state, schedule, 2, 1)[0]  # Next month: every week is ahead
+    weeks = list(range(1, min(args.weeks, len(schedule[key])) + 1))
+
+    claimed, rejected, busy = [], [], []
+
+    async def claim(user_id, week):
+        user = SimpleNamespace(id=user_id, display_name=f"user{user_id}")
+        try:
+            await planner.update_planner_week(state, 2, week,
+                                              planner.claim_slot(user))
+            claimed.append((week, user_id))
+        except ValueError as e:
+            (busy if "busy" in str(e) or "Couldn't" in str(e) else rejected).append(
+                (week, user_id, str(e)))
+
+    rival = []
+
+    async def rival_writer():
+        for i in range(args.rival):
+            await asyncio.sleep(random.uniform(0, args.latency))
+            week = random.choice(weeks)
+            if store.rival_claim(key, week, RIVAL_ID_BASE + i):
+                rival.append((week, RIVAL_ID_BASE + i))
+
+    refreshing = True
+
+    async def refresher():
+        # /eventplanner refetching the cache while claims are in flight
+        while refreshing:
+            await asyncio.to_thread(planner.ensure_schedule, state, True)
+
+    claims = []
+    for i in range(args.users):
+        week = weeks[i % len(weeks)]
+        claims.append(claim(i + 1, week))
+        if i % 10 == 0:  # A double submit, which must be refused
+            claims.append(claim(i + 1, week))
+    random.shuffle(claims)
+
+    started = time.perf_counter()
+    refresh_task = asyncio.create_task(refresher())
+    await asyncio.gather(rival_writer(), *claims)
+    refreshing = False
+    await refresh_task
+    elapsed = time.perf_counter() - started
+
+    stored = json.loads(store.text)[key]
+    holders = [(number, slot["id"]) for number, week in enumerate(stored, start=1)
+               for slot in week["slots"] if slot is not None]
+    expected = sorted(claimed + rival)
+
+    failures = []
+    if sorted(holders) != expected:
+        lost = set(expected) - set(holders)
+        extra = set(holders) - set(expected)
+        failures.append(f"stored claims differ: {len(lost)} lost, {len(extra)} unexpected")
+    duplicated = len(holders) - len(set(holders))
+    if duplicated:
+        failures.append(f"{duplicated} claim(s) stored twice")
+    if store.conflicts == 0:
+        failures.append("no commit lost a race, so the 409 retry path never ran")
+    for week, _, message in rejected:
+        if "already claimed" not in message and "filled" not in message:
+            failures.append(f"week {week}: unexpected rejection {message!r}")
+            break
+
+    report = [
+        f"{len(claims)} claims on {len(weeks)} week(s) of {args.slots} slots in {elapsed:.2f}s",
+        f"Succeeded {len(claimed)}, rejected {len(rejected)}, gave up {len(busy)}; "
+        f"rival replica claimed {len(rival)}",
+        f"Commits {store.writes}, lost races (409) {store.conflicts}",
+    ]
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--weeks", type=int, default=4,
+                        help="spread claims over this many weeks of next month")
+    parser.add_argument("--slots", type=int, default=40,
+                        help="slots per week")
+    parser.add_argument("--rival", type=int, default=20,
+                        help="claims made directly in the store by another replica")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="fake GitHub latency per call, in seconds")
+    args = parser.parse_args()
+
+    report, failures = asyncio.run(run(args))
+    print("\n".join(report))
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ No lost or duplicate claims.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""Bulk event import and export, as staff commands and an offline CLI.
+
+Files are CSV with a header row, or JSON Lines with one event object per
+line, using the EVENT_COLUMNS fields. Rows are validated one at a time as
+they're read, and a whole import lands as one storage write.
+
+    python -m cogs.bulk import season.csv --guild 1330703193591644180 --creator-id 123
+    python -m cogs.bulk export events.jsonl --guild 1330703193591644180
+"""
+import discord
+from discord import app_commands
+from discord.ext import commands
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import core
+from core import (DELETED_START, EMBED_DESCRIPTION_MAX, EMBED_FIELD_VALUE_MAX,
+                  clip, guild_state, leader_only, require_events, require_state,
+                  staff_only, storage)
+
+EVENT_COLUMNS = [
+    "name", "info", "start_time", "reward1", "reward2", "reward3",
+    "participation_reward", "creator_id", "creator_name", "channel_id",
+    "status"
+]
+REQUIRED_COLUMNS = ["name", "info", "start_time"]
+MAX_IMPORT_BYTES = 1024 * 1024
+MAX_IMPORT_ROWS = 500
+MAX_REPORTED_ERRORS = 15
+IMPORT_COMMIT_RETRIES = 3
+
+bot = None  # Set in setup()
+
+
+def file_format(filename):
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError("❌ Use a .csv or .jsonl file.")
+
+
+def read_rows(lines, fmt):
+    """Yield (line number, row, error) for each record, reading lines lazily."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        columns = reader.fieldnames or []
+        unknown = [c for c in columns if c not in EVENT_COLUMNS]
+        missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+        if unknown or missing:
+            yield 1, None, "header " + "; ".join(
+                filter(None, [
+                    unknown and f"has unknown column(s) {', '.join(unknown)}",
+                    missing and f"is missing {', '.join(missing)}"
+                ]))
+            return
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "more values than columns"
+            else:
+                yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"invalid JSON ({e.msg})"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        unknown = [key for key in row if key not in EVENT_COLUMNS]
+        if unknown:
+            yield number, None, f"unknown field(s) {', '.join(unknown)}"
+            continue
+        yield number, row, None
+
+
+def parse_start_time(value, tz, now):
+    """Read start_time as /createevent would, in the creator's timezone."""
+    try:
+        return core.parse_start_time(value, tz, now)
+    except ValueError:
+        raise ValueError(f"start_time {value!r} isn't a date, time, delay "
+                         "or <t:…> timestamp") from None
+
+
+def parse_id(value, field):
+    if not value.isdigit():
+        raise ValueError(f"{field} must be a numeric Discord ID")
+    return int(value)
+
+
+def event_from_row(row, creator, channel_id, now):
+    """Build an event like /createevent does; raises ValueError with the reason."""
+    text = {key: str(row.get(key) or "").strip() for key in EVENT_COLUMNS}
+    for key in REQUIRED_COLUMNS:
+        if not text[key]:
+            raise ValueError(f"missing {key}")
+    if text["status"] not in ("", "upcoming"):
+        raise ValueError(
+            f"only upcoming events can be imported (status is {text['status']})")
+    for key, limit in (("name", 256), ("info", EMBED_DESCRIPTION_MAX),
+                       ("reward1", EMBED_FIELD_VALUE_MAX),
+                       ("reward2", EMBED_FIELD_VALUE_MAX),
+                       ("reward3", EMBED_FIELD_VALUE_MAX),
+                       ("participation_reward", EMBED_FIELD_VALUE_MAX)):
+        if len(text[key]) > limit:
+            raise ValueError(f"{key} is longer than {limit} characters")
+
+    if text["creator_id"]:
+        creator_id = parse_id(text["creator_id"], "creator_id")
+        if creator is None or creator_id != creator["id"]:
+            creator = {
+                "id": creator_id,
+                "name": text["creator_name"] or str(creator_id)
+            }
+    elif creator is None:
+        raise ValueError("missing creator_id")
+    if text["channel_id"]:
+        channel_id = parse_id(text["channel_id"], "channel_id")
+
+    start_time = parse_start_time(text["start_time"],
+                                  core.user_zone(creator["id"]), now)
+    if start_time <= now:
+        raise ValueError("start_time is in the past")
+
+    return {
+        "name": text["name"],
+        "info": text["info"],
+        "reward1": text["reward1"],
+        "reward2": text["reward2"],
+        "reward3": text["reward3"],
+        "participation_reward": text["participation_reward"],
+        "start_time": start_time,
+        "started": False,
+        "creator": creator,
+        "channel_id": channel_id
+    }
+
+
+def validate_import(lines, fmt, existing, creator, channel_id):
+    """Validate rows as they're read. Returns (events, [(line number, error)]).
+
+    A row repeating an existing event (same name and start time), or an
+    earlier row, is rejected, so re-running an import is harmless.
+    """
+    now = datetime.now(tz=timezone.utc)
+    seen = {(e["name"].lower(), e["start_time"])
+            for e in existing if isinstance(e["start_time"], datetime)}
+    events, errors = [], []
+    for number, row, error in read_rows(lines, fmt):
+        if error is None and len(events) >= MAX_IMPORT_ROWS:
+            errors.append((number, f"more than {MAX_IMPORT_ROWS} events, split the file"))
+            break
+        if error is None:
+            try:
+                event = event_from_row(row, creator, channel_id, now)
+            except ValueError as e:
+                error = str(e)
+            else:
+                key = (event["name"].lower(), event["start_time"])
+                if key not in seen:
+                    seen.add(key)
+                    events.append(event)
+                    continue
+                error = "duplicate of an existing event"
+        errors.append((number, error))
+    return events, errors
+
+
+def error_report(errors):
+    lines = [f"Line {number}: {error}"
+             for number, error in errors[:MAX_REPORTED_ERRORS]]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        lines.append(f"…and {len(errors) - MAX_REPORTED_ERRORS} more")
+    return "\n".join(lines)
+
+
+def event_status(event, now):
+    start = event["start_time"]
+    if isinstance(start, str):
+        start = datetime.fromisoformat(start)
+    if start == DELETED_START:
+        return "deleted"
+    if event.get("ended"):
+        return "ended"
+    if event.get("started"):
+        return "announced"
+    return "upcoming" if start > now else "missed"
+
+
+def export_row(event, now):
+    start = event["start_time"]
+    return {
+        **{key: event.get(key, "") for key in EVENT_COLUMNS},
+        "start_time": start.isoformat() if isinstance(start, datetime) else start,
+        "creator_id": event["creator"]["id"],
+        "creator_name": event["creator"]["name"],
+        "channel_id": event.get("channel_id") or "",
+        "status": event_status(event, now)
+    }
+
+
+def write_export(events, fmt, out, upcoming_only=False):
+    """Write events to the text stream out one row at a time; returns the row count."""
+    now = datetime.now(tz=timezone.utc)
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(out, EVENT_COLUMNS)
+        writer.writeheader()
+    count = 0
+    for event in events:
+        row = export_row(event, now)
+        if upcoming_only and row["status"] != "upcoming":
+            continue
+        if writer:
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(row) + "\n")
+        count += 1
+    out.flush()
+    return count
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array, decoding one chunk at a time."""
+    decoder = json.JSONDecoder()
+    buffer, opened = "", False
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not opened:
+                if not buffer:
+                    break
+                if buffer[0] != "[":
+                    raise ValueError("expected a JSON array of events")
+                buffer, opened = buffer[1:], True
+            elif buffer.startswith(","):
+                buffer = buffer[1:]
+            elif buffer.startswith("]"):
+                return
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    break  # Item continues in the next chunk
+                yield item
+                buffer = buffer[end:]
+        if not chunk:
+            if opened or buffer:
+                raise ValueError("the events file ends in the middle of the array")
+            return
+
+
+async def apply_import(state, events):
+    """Append the events with one storage write, then schedule only the new ones."""
+    first = len(state.events)
+    state.events.extend(events)
+    for index in range(first, len(state.events)):
+        state.name_index.add(index, state.events[index])
+    await storage(bot).save_events(state)
+    bot.get_cog("Scheduler").schedule_events(state,
+                                             range(first, len(state.events)))
+
+
+class Bulk(commands.Cog):
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="importevents",
+                          description="Create many events at once from a .csv or .jsonl file")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        file=
+        "Columns: name, info, start_time (date and time, delay or <t:…>), rewards, creator_id, channel_id",
+        skip_invalid="Import the valid rows even if other rows have errors")
+    async def importevents(self, interaction: discord.Interaction,
+                           file: discord.Attachment,
+                           skip_invalid: bool = False):
+        state = await require_events(interaction)
+        if state is None:
+            return
+        try:
+            fmt = file_format(file.filename)
+        except ValueError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        if file.size > MAX_IMPORT_BYTES:
+            await interaction.response.send_message(
+                f"❌ The file is over {MAX_IMPORT_BYTES // 1024} KB, split it up.",
+                ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            text = (await file.read()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            await interaction.followup.send("❌ The file isn't UTF-8 text.",
+                                            ephemeral=True)
+            return
+
+        creator = {"id": interaction.user.id, "name": str(interaction.user)}
+        events, errors = await asyncio.to_thread(validate_import,
+                                                 io.StringIO(text, newline=""),
+                                                 fmt, list(state.events),
+                                                 creator, interaction.channel_id)
+        if errors and (not skip_invalid or not events):
+            await interaction.followup.send(clip(
+                f"❌ Nothing imported, {len(errors)} row(s) have errors:\n{error_report(errors)}",
+                2000),
+                                            ephemeral=True)
+            return
+        if not events:
+            await interaction.followup.send("❌ The file has no events.",
+                                            ephemeral=True)
+            return
+
+        await apply_import(state, events)
+        summary = f"✅ Imported {len(events)} event(s)."
+        if errors:
+            summary += f" Skipped {len(errors)} row(s):\n{error_report(errors)}"
+        await interaction.followup.send(clip(summary, 2000), ephemeral=True)
+
+    @app_commands.command(name="exportevents",
+                          description="Download this server's events as a file")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        format="File format",
+        upcoming_only="Leave out announced, ended and deleted events")
+    @app_commands.choices(format=[
+        app_commands.Choice(name="CSV", value="csv"),
+        app_commands.Choice(name="JSON Lines", value="jsonl")
+    ])
+    async def exportevents(self, interaction: discord.Interaction,
+                           format: str = "csv",
+                           upcoming_only: bool = False):
+        state = await require_state(interaction)
+        if state is None:
+            return
+        await interaction.response.defer(ephemeral=True)
+        # Rows go straight to a temporary file instead of a string in memory
+        out = tempfile.TemporaryFile()
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        count = await asyncio.to_thread(write_export, list(state.events),
+                                        format, text, upcoming_only)
+        text.detach()
+        out.seek(0)
+        await interaction.followup.send(
+            f"📤 Exported {count} event(s).",
+            file=discord.File(out, filename=f"events-{state.guild_id}.{format}"),
+            ephemeral=True)
+
+
+async def setup(client):
+    global bot
+    bot = client
+    await bot.add_cog(Bulk(bot))
+
+
+# --- OFFLINE CLI ---
+def import_offline(args, state):
+    from cogs.storage import events_json, fetch_github_file, put_github_file
+
+    creator = {
+        "id": args.creator_id,
+        "name": args.creator_name or str(args.creator_id)
+    } if args.creator_id else None
+    path = state.config["events_file"]
+    for attempt in range(IMPORT_COMMIT_RETRIES):
+        existing, sha = fetch_github_file(path, kind="write")
+        existing = existing or []
+        for e in existing:
+            if isinstance(e["start_time"], str):
+                e["start_time"] = datetime.fromisoformat(e["start_time"])
+        with open(args.file, newline="", encoding="utf-8-sig") as f:
+            events, errors = validate_import(f, file_format(args.file),
+                                             existing, creator, args.channel_id)
+        for number, error in errors:
+            print(f"{args.file}:{number}: {error}", file=sys.stderr)
+        if errors and not args.skip_invalid:
+            print(f"❌ Nothing imported, {len(errors)} row(s) have errors.")
+            return 1
+        if not events or args.dry_run:
+            print(f"✅ {len(events)} event(s) are valid, nothing written.")
+            return 0
+        if put_github_file(path, events_json(existing + events), sha,
+                           f"Import {len(events)} events", kind="write"):
+            # The leader's own writes keep stored events it hasn't seen, so
+            # these survive until its next sync pass picks them up and schedules them
+            print(f"✅ Imported {len(events)} event(s) into {path}.")
+            return 0
+    print("❌ The events file kept changing underneath us, try again.")
+    return 1
+
+
+def export_offline(args, state):
+    from cogs.storage import stream_github_file
+
+    if args.source:
+        source = open(args.source, encoding="utf-8")
+    else:
+        source = stream_github_file(state.config["events_file"]) or io.StringIO("[]")
+    fmt = file_format(args.file)
+    with source, open(args.file, "w", newline="", encoding="utf-8") as out:
+        count = write_export(iter_json_array(source), fmt, out,
+                             args.upcoming_only)
+    print(f"📤 Exported {count} event(s) to {args.file}.")
+    return 0
+
+
+def main_cli(argv=None):
+    from cogs.storage import load_guild_configs, load_timezones
+
+    parser = argparse.ArgumentParser(
+        description="Import or export a guild's events without running the bot.")
+    parser.add_argument("--guild", type=int,
+                        help="Guild ID (default: the first configured guild)")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    importer = subcommands.add_parser("import", help="Add events from a .csv or .jsonl file")
+    importer.add_argument("file")
+    importer.add_argument("--creator-id", type=int,
+                          help="Host for rows without a creator_id")
+    importer.add_argument("--creator-name")
+    importer.add_argument("--channel-id", type=int,
+                          help="Announcement channel for rows without a channel_id")
+    importer.add_argument("--skip-invalid", action="store_true",
+                          help="Import the valid rows even if other rows have errors")
+    importer.add_argument("--dry-run", action="store_true",
+                          help="Only validate the file")
+    exporter = subcommands.add_parser("export", help="Write events to a .csv or .jsonl file")
+    exporter.add_argument("file")
+    exporter.add_argument("--source",
+                          help="Read a local events JSON file instead of GitHub")
+    exporter.add_argument("--upcoming-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    core.guild_configs.update(load_guild_configs())
+    core.user_timezones.update(load_timezones())
+    guild_id = args.guild or next(iter(core.guild_configs), None)
+    state = guild_state(guild_id)
+    if state is None:
+        parser.error(f"guild {guild_id} isn't configured")
+    try:
+        if args.command == "import":
+            return import_offline(args, state)
+        return export_offline(args, state)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,390 @@
+"""The monthly event planner and its /claim and /unclaim slots."""
+import discord
+from discord import app_commands
+from discord.ext import commands
+import re
+import json
+import time
+import asyncio
+import bisect
+import calendar
+from datetime import date, datetime, timezone
+
+from core import (cached_render, leader_only, leading, paginate_embed,
+                  pager_kwargs, require_state, staff_only, storage)
+
+bot = None  # Set in setup()
+
+
+# --- EVENT PLANNER (claim/unclaim) ---
+PLANNER_SLOT_CAPACITY = 2  # Default number of hosts per week
+PLANNER_TTL = 300  # Seconds before the cached schedule is refetched
+PLANNER_COMMIT_RETRIES = 5
+LEGACY_WEEK_RANGE = re.compile(r"(\d+)-(\d+) ")
+
+
+def fetch_github_planner(state):
+    """Return the guild's schedule and the blob SHA it was read at."""
+    data, sha = storage(bot).fetch_github_file(state.config["planner_file"])
+    return data or {}, sha
+
+
+def put_github_planner(state, data, sha):
+    """Write the schedule only if the file on GitHub is still at sha.
+
+    Returns the new SHA, or None if someone else committed first.
+    """
+    return storage(bot).put_github_file(state.config["planner_file"],
+                                     data,
+                                     sha,
+                                     "Update eventplanner",
+                                     indent=2)
+
+
+def month_key(year, month):
+    return f"{year}-{month}"
+
+
+def new_week(start, end, capacity=PLANNER_SLOT_CAPACITY):
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "capacity": capacity,
+        "slots": [None] * capacity
+    }
+
+
+def generate_month(year, month):
+    """Split a month into 7-day weeks, folding leftover days into the last week."""
+    _, days_in_month = calendar.monthrange(year, month)
+    weeks = []
+    for start_day in range(1, days_in_month + 1, 7):
+        end_day = min(start_day + 6, days_in_month)
+        if end_day - start_day < 6 and weeks:
+            weeks[-1]["end"] = date(year, month, days_in_month).isoformat()
+            break
+        weeks.append(
+            new_week(date(year, month, start_day), date(year, month, end_day)))
+    return weeks
+
+
+def migrate_planner(schedule):
+    """Convert legacy "1-7 November 2025" week ranges to ISO start/end dates.
+
+    Returns True if anything was migrated.
+    """
+    migrated = False
+    for key, weeks in schedule.items():
+        year, month = map(int, key.split("-"))
+        for week in weeks:
+            if "range" not in week:
+                continue
+            start_day, end_day = map(
+                int,
+                LEGACY_WEEK_RANGE.match(week["range"]).groups())
+            slots = week["slots"]
+            week.clear()
+            week.update(start=date(year, month, start_day).isoformat(),
+                        end=date(year, month, end_day).isoformat(),
+                        capacity=len(slots),
+                        slots=slots)
+            migrated = True
+    return migrated
+
+
+def track_planner_version(state, schedule):
+    """Bump the planner version if the schedule differs from the last one seen."""
+    if schedule != state.planner_snapshot:
+        state.planner_version += 1
+        state.planner_snapshot = json.loads(json.dumps(schedule))
+
+
+def ensure_schedule(state, refresh=False):
+    """Ensure schedule contains full current + next month; old weeks remain in file but are pruned only if month is before current.
+
+    The schedule is cached in memory and only refetched from GitHub after PLANNER_TTL.
+    Runs in a worker thread while claims may be in flight, so the cache is never
+    changed in place: a new one replaces it, with the schedule and its SHA together.
+    """
+    cache = state.planner_cache
+    today = date.today()
+    current = month_key(today.year, today.month)
+    schedule = cache["schedule"]
+    stale = time.monotonic() - cache["fetched_at"] > PLANNER_TTL
+    if (schedule is not None and not refresh and not stale
+            and cache["month"] == current):
+        return schedule
+
+    if schedule is None or refresh or stale:
+        schedule, sha = fetch_github_planner(state)
+        fetched_at = time.monotonic()
+        if migrate_planner(schedule) and leading():
+            print("🔁 Migrated eventplanner.json to ISO week dates.")
+            sha = put_github_planner(state, schedule, sha) or sha
+    else:
+        schedule = json.loads(json.dumps(schedule))
+        sha, fetched_at = cache["sha"], cache["fetched_at"]
+
+    year, month = today.year, today.month
+    next_month = month + 1 if month < 12 else 1
+    next_year = year if month < 12 else year + 1
+
+    # Add months if missing
+    for y, m in [(year, month), (next_year, next_month)]:
+        key = month_key(y, m)
+        if key not in schedule:
+            schedule[key] = generate_month(y, m)
+
+    # Prune only completely old months (not individual weeks)
+    for key in list(schedule.keys()):
+        y, m = map(int, key.split("-"))
+        if y < year or (y == year and m < month):
+            del schedule[key]
+
+    state.planner_cache = {
+        "schedule": schedule,
+        "sha": sha,
+        "fetched_at": fetched_at,
+        "month": current
+    }
+    track_planner_version(state, schedule)
+    return schedule
+
+
+def get_planner_index(state, schedule):
+    """Sorted month keys, plus per month the week end ordinals and display labels.
+
+    Rebuilt once per planner version so lookups never parse strings.
+    """
+    index = state.planner_index
+    if index["version"] != state.planner_version:
+        weeks_by_month = {}
+        for key, weeks in schedule.items():
+            ends, labels = [], []
+            for week in weeks:
+                start = date.fromisoformat(week["start"])
+                end = date.fromisoformat(week["end"])
+                ends.append(end.toordinal())
+                labels.append(
+                    f"{start.day}-{end.day} {calendar.month_name[end.month]} {end.year}"
+                )
+            weeks_by_month[key] = (ends, labels)
+        months = sorted(weeks_by_month,
+                        key=lambda k: tuple(map(int, k.split("-"))))
+        index.update(version=state.planner_version,
+                     months=months,
+                     weeks=weeks_by_month)
+    return index
+
+
+def future_weeks(state, schedule, key):
+    """Return (week number, week, label) for weeks ending today or later, keeping original week numbers."""
+    ends, labels = get_planner_index(state, schedule)["weeks"].get(key, ([], []))
+    first = bisect.bisect_left(ends, date.today().toordinal())
+    return [(number + 1, schedule[key][number], labels[number])
+            for number in range(first, len(ends))]
+
+
+def render_planner(state, schedule):
+    def build(now):
+        fields = []
+        expires_at = None
+        index = get_planner_index(state, schedule)
+        for key in index["months"]:
+            weeks = future_weeks(state, schedule, key)
+            if not weeks:
+                continue  # skip months with no upcoming weeks
+
+            fields.append((f"**{key}**", "\u200b"))
+            for week_number, week, label in weeks:
+                claims = ", ".join(slot_label(slot) for slot in week["slots"])
+                fields.append((f"Week {week_number} ({label})",
+                               f"Slots: {claims}"))
+            # The first listed week drops off at midnight after its end date
+            end = index["weeks"][key][0][weeks[0][0] - 1]
+            week_over = datetime.combine(date.fromordinal(end + 1),
+                                         datetime.min.time()).astimezone(
+                                             timezone.utc)
+            if expires_at is None or week_over < expires_at:
+                expires_at = week_over
+        embeds = paginate_embed("📅 Event Planner", fields,
+                                discord.Color.blue())
+        return embeds, expires_at
+
+    return cached_render(state, "planner", state.planner_version, build)
+
+
+def find_week(state, schedule, month_index, week):
+    """Resolve /claim and /unclaim arguments to (month key, week, error message)."""
+    months = get_planner_index(state, schedule)["months"]
+    if month_index < 1 or month_index > len(months):
+        return None, None, "❌ Invalid month index. Choose 1 or 2."
+    key = months[month_index - 1]
+    for week_number, entry, _ in future_weeks(state, schedule, key):
+        if week_number == week:
+            return key, entry, None
+    return key, None, "❌ This week has already passed or is invalid."
+
+
+def slot_label(slot):
+    if slot is None:
+        return "[Open]"
+    return slot["name"] if isinstance(slot, dict) else slot
+
+
+def holds_slot(slot, user):
+    """Slots store {"id", "name"}; plain strings are display names from older claims."""
+    if isinstance(slot, dict):
+        return slot["id"] == user.id
+    return slot is not None and slot == user.display_name
+
+
+def claim_slot(user):
+
+    def mutate(week):
+        slots = week["slots"]
+        if any(holds_slot(slot, user) for slot in slots):
+            raise ValueError("❌ You already claimed this slot.")
+        if None not in slots:
+            raise ValueError("❌ All slots are already filled.")
+        slots[slots.index(None)] = {"id": user.id, "name": user.display_name}
+
+    return mutate
+
+
+def unclaim_slot(user):
+
+    def mutate(week):
+        slots = week["slots"]
+        for idx, slot in enumerate(slots):
+            if holds_slot(slot, user):
+                slots[idx] = None
+                return
+        raise ValueError("❌ You didn't claim this week.")
+
+    return mutate
+
+
+async def update_planner_week(state, month_index, week, mutate):
+    """Apply mutate to one week and commit it with compare-and-swap on the file SHA.
+
+    Claims on the same week are serialized by an in-process lock; a commit that
+    loses a race with another writer refetches the schedule and tries again.
+    mutate raises ValueError with a user-facing message to abort. Returns the month key.
+    """
+    try:
+        schedule = await asyncio.to_thread(ensure_schedule, state)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        raise ValueError("❌ Couldn't load the planner, please try again.")
+    key, entry, error = find_week(state, schedule, month_index, week)
+    if error:
+        raise ValueError(error)
+
+    lock = state.planner_locks.setdefault((key, week), asyncio.Lock())
+    async with lock:
+        for attempt in range(PLANNER_COMMIT_RETRIES):
+            cache = state.planner_cache  # Schedule and SHA from the same read
+            schedule = json.loads(json.dumps(cache["schedule"]))
+            key, entry, error = find_week(state, schedule, month_index, week)
+            if error:
+                raise ValueError(error)
+            mutate(entry)
+            try:
+                new_sha = await asyncio.to_thread(put_github_planner, state,
+                                                  schedule,
+                                                  cache["sha"])
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                raise ValueError(
+                    "❌ Couldn't save the planner, please try again.")
+            if new_sha:
+                state.planner_cache = {**cache, "schedule": schedule, "sha": new_sha}
+                track_planner_version(state, schedule)
+                return key
+            try:
+                await asyncio.to_thread(ensure_schedule, state, True)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                raise ValueError(
+                    "❌ Couldn't load the planner, please try again.")
+    raise ValueError("❌ The planner is busy, please try again.")
+
+
+
+class Planner(commands.Cog):
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # --- EVENTPLANNER COMMAND ---
+    @app_commands.command(
+        name="eventplanner",
+        description="Show the event schedule for this and next month"
+    )
+    @leader_only()
+    async def eventplanner(self, interaction: discord.Interaction):
+        state = await require_state(interaction)
+        if state is None:
+            return
+        try:
+            schedule = await asyncio.to_thread(ensure_schedule, state)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return await interaction.response.send_message(
+                "❌ Couldn't load the planner, please try again.", ephemeral=True)
+        await interaction.response.send_message(**pager_kwargs(
+            render_planner(state, schedule)),
+                                                ephemeral=True)
+
+    # --- CLAIM COMMAND ---
+    @app_commands.command(
+        name="claim",
+        description="Claim a week slot"
+    )
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        month_index="1 = first month, 2 = second month",
+        week="Week number in the month (original number)"
+    )
+    async def claim(self, interaction: discord.Interaction, month_index: int, week: int):
+        state = await require_state(interaction)
+        if state is None:
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            month_key = await update_planner_week(state, month_index, week,
+                                                  claim_slot(interaction.user))
+        except ValueError as e:
+            return await interaction.followup.send(str(e), ephemeral=True)
+        await interaction.followup.send(f"✅ You claimed week {week} of {month_key}.", ephemeral=True)
+
+    # --- UNCLAIM COMMAND ---
+    @app_commands.command(
+        name="unclaim",
+        description="Unclaim your week slot"
+    )
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        month_index="1 = first month, 2 = second month",
+        week="Week number in the month (original number)"
+    )
+    async def unclaim(self, interaction: discord.Interaction, month_index: int, week: int):
+        state = await require_state(interaction)
+        if state is None:
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            month_key = await update_planner_week(state, month_index, week,
+                                                  unclaim_slot(interaction.user))
+        except ValueError as e:
+            return await interaction.followup.send(str(e), ephemeral=True)
+        await interaction.followup.send(f"✅ You unclaimed week {week} of {month_key}.", ephemeral=True)
+
+
+async def setup(client):
+    global bot
+    bot = client
+    await bot.add_cog(Planner(bot))
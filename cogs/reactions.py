@@ -0,0 +1,532 @@
+"""Participant role handling, the participation ledger and its reconciler."""
+import discord
+from discord import app_commands
+from discord.ext import commands
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from core import (EMBED_FIELD_VALUE_MAX, LEAN_MEMBERS, clip, guild_configs,
+                  guild_state, guild_states, leader_autocomplete, leader_only,
+                  leading, paginate_embed, pager_kwargs, participant_role,
+                  require_state, staff_only)
+
+bot = None  # Set in setup()
+
+
+# --- PARTICIPANT TRACKING ---
+# In lean member mode the member cache is empty, so who holds the Participant
+# role is tracked here: one REST scan per process (or when the role is
+# reconfigured), then role changes from GUILD_MEMBER_UPDATE and from the bot's
+# own add/remove calls. Followers track them too, so a failover needs no rescan.
+async def load_participants(state):
+    guild = bot.get_guild(state.guild_id)
+    role = participant_role(guild) if guild else None
+    if role is None or state.participants_role_id == role.id:
+        return
+    found = set()
+    async for member in guild.fetch_members(limit=None):
+        if member.get_role(role.id):
+            found.add(member.id)
+    state.participant_ids = found
+    state.participants_role_id = role.id
+    print(f"👥 Tracking {len(found)} Participant(s) in guild {state.guild_id}")
+
+
+async def confirm_participants(guild, role, user_ids):
+    """Look up just these members, correcting the tracked set for role changes
+    missed while disconnected. Returns {user id: holds the role}, leaving out
+    users who have left the server."""
+    holds = {}
+    for user_id in user_ids:
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            track_participant(guild.id, user_id, False)
+            continue
+        except discord.HTTPException:
+            holds[user_id] = has_participant_role(guild, role, user_id)  # Keep what we had
+            continue
+        holds[user_id] = member.get_role(role.id) is not None
+        track_participant(guild.id, user_id, holds[user_id])
+    return holds
+
+
+def track_participant(guild_id, user_id, holds_role):
+    state = guild_states.get(guild_id)
+    if not LEAN_MEMBERS or state is None:
+        return
+    if holds_role:
+        state.participant_ids.add(user_id)
+    else:
+        state.participant_ids.discard(user_id)
+
+
+def has_participant_role(guild, role, user_id):
+    if LEAN_MEMBERS:
+        state = guild_states.get(guild.id)
+        return state is not None and user_id in state.participant_ids
+    member = guild.get_member(user_id)
+    return member is not None and role in member.roles
+
+
+def participant_holders(guild, role):
+    if LEAN_MEMBERS:
+        state = guild_states.get(guild.id)
+        return list(state.participant_ids) if state else []
+    return [member.id for member in role.members]
+
+
+async def give_participant_role(guild, role, user_id, reason=None):
+    """Add the role by user ID, so no Member object is needed. Returns False if already held."""
+    if has_participant_role(guild, role, user_id):
+        return False
+    await bot.http.add_role(guild.id, user_id, role.id, reason=reason)
+    track_participant(guild.id, user_id, True)
+    return True
+
+
+async def take_participant_role(guild, role, user_id, reason=None):
+    if not has_participant_role(guild, role, user_id):
+        return False
+    await bot.http.remove_role(guild.id, user_id, role.id, reason=reason)
+    track_participant(guild.id, user_id, False)
+    return True
+
+
+async def bot_reacted_to_message(message):
+    for reaction in message.reactions:
+        if reaction.emoji == "✅":
+            async for user in reaction.users():
+                if user.id == bot.user.id:
+                    return True
+    return False
+
+
+@leader_autocomplete
+async def ledger_event_autocomplete(interaction: discord.Interaction,
+                                    current: str):
+    state = guild_state(interaction.guild_id)
+    if state is None or state.ledger is None:
+        return []
+    return [
+        app_commands.Choice(name=clip(
+            f"{state.ledger.events[message_id]['name']} — {state.ledger.events[message_id]['day']}",
+            100),
+                            value=str(message_id))
+        for message_id in state.ledger.search(current)
+    ]
+
+
+def mention_fields(user_ids, heading):
+    """Pack user mentions into as few embed fields as the value limit allows."""
+    fields, chunk = [], ""
+    for user_id in user_ids:
+        mention = f"<@{user_id}> "
+        if len(chunk) + len(mention) > EMBED_FIELD_VALUE_MAX:
+            fields.append((heading if not fields else "\u200b", chunk))
+            chunk = ""
+        chunk += mention
+    if chunk:
+        fields.append((heading if not fields else "\u200b", chunk))
+    return fields
+
+
+async def require_ledger(interaction):
+    state = await require_state(interaction)
+    if state is None:
+        return None
+    if state.ledger is None:
+        await interaction.response.send_message(
+            "⏳ The participation ledger is still loading, try again shortly.",
+            ephemeral=True)
+        return None
+    return state
+
+
+# --- PARTICIPANT RECONCILER ---
+# Reactions made while the bot was offline never reach the reaction handlers.
+# After startup, a resume or a leadership change, the reactors on announcements
+# since the last /end are compared with who holds the role, and only the
+# difference is queued. Holders who got the role some other way (/eventroler
+# prompts, manual grants) are left alone.
+ROLE_OPS_PER_SECOND = 2
+
+
+def active_announcements(state):
+    return [
+        e for e in state.events
+        if e.get("started") and e.get("message_id") and not e.get("ended")
+    ]
+
+
+async def announcement_reactors(guild, event):
+    """Return the IDs of users with a ✅ on an announcement, or None if it can't be read."""
+    channel = guild.get_channel(event.get("channel_id"))
+    if channel is None:
+        return None
+    try:
+        message = await channel.fetch_message(event["message_id"])
+    except discord.HTTPException:
+        return None
+    reaction = discord.utils.get(message.reactions, emoji="\u2705")
+    if reaction is None:
+        return set()
+    return {user.id async for user in reaction.users() if not user.bot}
+
+
+async def reconcile_participants(state):
+    await state.ledger_ready.wait()
+    guild = bot.get_guild(state.guild_id)
+    role = participant_role(guild) if guild else None
+    if role is None or not leading():
+        return
+
+    ledger = state.ledger
+    reactors, recorded = set(), set()
+    for event in active_announcements(state):
+        users = await announcement_reactors(guild, event)
+        if users is None:
+            continue
+        reactors |= users
+        message_id = event["message_id"]
+        if message_id in ledger.participants:
+            # Bring the ledger in line with the reactions it missed
+            joined = set(ledger.participants[message_id])
+            recorded |= joined
+            for user_id in users - joined:
+                ledger.join(message_id, user_id)
+            for user_id in joined - users:
+                ledger.leave(message_id, user_id)
+
+    to_add = [u for u in reactors if not has_participant_role(guild, role, u)]
+    to_remove = [
+        u for u in recorded - reactors if has_participant_role(guild, role, u)
+    ]
+    if LEAN_MEMBERS and (to_add or to_remove):
+        # Check only the difference against Discord, one lookup per user
+        holds = await confirm_participants(guild, role, to_add + to_remove)
+        to_add = [u for u in to_add if holds.get(u) is False]
+        to_remove = [u for u in to_remove if holds.get(u)]
+    for user_id in to_add:
+        queue_role_op(state, user_id, True)
+    for user_id in to_remove:
+        queue_role_op(state, user_id, False)
+    print(
+        f"🔁 Reconciled Participants in guild {state.guild_id}: +{len(to_add)} -{len(to_remove)}"
+    )
+
+
+async def refresh_participants(state):
+    if LEAN_MEMBERS:
+        # On every replica, so a follower taking over already has the holders
+        await load_participants(state)
+    if leading():
+        await reconcile_participants(state)
+
+
+def queue_role_op(state, user_id, add):
+    state.role_ops[user_id] = add  # A later op for the same user replaces the earlier one
+    if state.role_worker is None or state.role_worker.done():
+        state.role_worker = asyncio.create_task(role_worker(state))
+
+
+async def role_worker(state):
+    """Apply queued role changes one at a time, at most ROLE_OPS_PER_SECOND."""
+    guild = bot.get_guild(state.guild_id)
+    role = participant_role(guild) if guild else None
+    while state.role_ops and role is not None and leading():
+        user_id = next(iter(state.role_ops))
+        add = state.role_ops.pop(user_id)
+        try:
+            if add:
+                await give_participant_role(guild, role, user_id,
+                                            reason="Reconciled after downtime")
+            else:
+                await take_participant_role(guild, role, user_id,
+                                            reason="Reconciled after downtime")
+        except discord.HTTPException as e:
+            print(f"Failed to reconcile role for {user_id}: {e}")
+        await asyncio.sleep(1 / ROLE_OPS_PER_SECOND)
+
+
+class Reactions(commands.Cog):
+
+    participant_holders = staticmethod(participant_holders)
+    give_participant_role = staticmethod(give_participant_role)
+    take_participant_role = staticmethod(take_participant_role)
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.parse_member_update = None
+
+    async def cog_load(self):
+        if LEAN_MEMBERS:
+            # on_member_update only fires for cached members, so watch the raw event
+            parsers = self.bot._connection.parsers
+            parse_member_update = self.parse_member_update = parsers[
+                "GUILD_MEMBER_UPDATE"]
+
+            def parse_member_update_lean(data):
+                guild = bot.get_guild(int(data["guild_id"]))
+                role = participant_role(guild) if guild else None
+                if role:
+                    track_participant(guild.id, int(data["user"]["id"]),
+                                      str(role.id) in data.get("roles", []))
+                parse_member_update(data)
+
+            parsers["GUILD_MEMBER_UPDATE"] = parse_member_update_lean
+
+    async def cog_unload(self):
+        if self.parse_member_update:
+            self.bot._connection.parsers[
+                "GUILD_MEMBER_UPDATE"] = self.parse_member_update
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Re-run on every READY, since a new session may have missed reactions
+        for guild_id in guild_configs:
+            self.bot.loop.create_task(
+                refresh_participants(guild_state(guild_id)))
+
+    @commands.Cog.listener()
+    async def on_guild_configured(self, state):
+        self.bot.loop.create_task(refresh_participants(state))
+
+    @commands.Cog.listener()
+    async def on_leadership_change(self, leader):
+        if leader:
+            for state in guild_states.values():
+                self.bot.loop.create_task(refresh_participants(state))
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if payload.emoji.name != "✅" or payload.user_id == bot.user.id:
+            return
+        if not leading():
+            return
+
+        state = guild_states.get(payload.guild_id)
+        if state and state.ledger and payload.message_id in state.ledger.events:
+            # A tracked announcement: no need to fetch the message to check it
+            state.ledger.join(payload.message_id, payload.user_id)
+        else:
+            channel = bot.get_channel(payload.channel_id)
+            if not channel:
+                return
+            try:
+                message = await channel.fetch_message(payload.message_id)
+            except:
+                return
+
+            if not await bot_reacted_to_message(message):
+                return
+
+        guild = bot.get_guild(payload.guild_id)
+        if not guild:
+            return
+        role = participant_role(guild)
+        if role and await give_participant_role(guild, role, payload.user_id):
+            print(f"✅ Assigned Participant role to {payload.user_id}")
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if (payload.emoji.name != "✅" or not leading()
+                or payload.user_id == bot.user.id):
+            return
+        state = guild_states.get(payload.guild_id)
+        if state and state.ledger and payload.message_id in state.ledger.events:
+            state.ledger.leave(payload.message_id, payload.user_id)
+        guild = bot.get_guild(payload.guild_id)
+        role = participant_role(guild) if guild else None
+        if role and await take_participant_role(guild, role, payload.user_id):
+            print(f"❎ Removed Participant role from {payload.user_id}")
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        track_participant(payload.guild_id, payload.user.id, False)
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        for state in guild_states.values():
+            self.bot.loop.create_task(refresh_participants(state))
+
+    @app_commands.command(name="participants",
+                      description="List who joined an announced event")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(event="The announced event")
+    @app_commands.autocomplete(event=ledger_event_autocomplete)
+    async def participants(self, interaction: discord.Interaction, event: str):
+        state = await require_ledger(interaction)
+        if state is None:
+            return
+        ledger = state.ledger
+        message_id = int(event) if event.isdigit() else None
+        if message_id not in ledger.events:
+            matches = ledger.search(event, limit=1)
+            message_id = matches[0] if matches else None
+        if message_id is None:
+            await interaction.response.send_message(
+                "❌ No announced event with that name.", ephemeral=True)
+            return
+
+        meta = ledger.events[message_id]
+        user_ids = ledger.participants[message_id]
+        embeds = paginate_embed(
+            f"👥 {clip(meta['name'], 200)}",
+            mention_fields(user_ids, "Participants"),
+            discord.Color.green(),
+            description=
+            f"{len(user_ids)} participant(s) · {meta['day']} · hosted by <@{meta['creator_id']}>")
+        await interaction.response.send_message(**pager_kwargs(embeds),
+                                                ephemeral=True)
+
+    @app_commands.command(name="topparticipants",
+                      description="Show who joined the most events in a date range")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(start="First day, YYYY-MM-DD (default: 30 days ago)",
+                           end="Last day, YYYY-MM-DD (default: today)",
+                           limit="How many users to show")
+    async def topparticipants(self, interaction: discord.Interaction,
+                                    start: str = None,
+                                    end: str = None,
+                                    limit: app_commands.Range[int, 1, 100] = 10):
+        state = await require_ledger(interaction)
+        if state is None:
+            return
+        today = datetime.now(tz=timezone.utc).date()
+        try:
+            first = date.fromisoformat(start) if start else today - timedelta(
+                days=30)
+            last = date.fromisoformat(end) if end else today
+        except ValueError:
+            await interaction.response.send_message(
+                "❌ Invalid date. Use YYYY-MM-DD.", ephemeral=True)
+            return
+
+        top = state.ledger.top(first.isoformat(), last.isoformat(), limit)
+        if not top:
+            await interaction.response.send_message(
+                "No participation recorded in that range.", ephemeral=True)
+            return
+        lines = [f"**{rank}.** <@{user_id}> — {joins} event(s)"
+                 for rank, (user_id, joins) in enumerate(top, start=1)]
+        fields = [("\u200b", "\n".join(lines[i:i + 10]))
+                  for i in range(0, len(lines), 10)]
+        embeds = paginate_embed("🏆 Top Participants",
+                                fields,
+                                discord.Color.gold(),
+                                description=f"{first} to {last}")
+        await interaction.response.send_message(**pager_kwargs(embeds),
+                                                ephemeral=True)
+
+    @app_commands.command(name="creatorstats",
+                      description="Participation stats for an event host")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(creator="The host (default: you)")
+    async def creatorstats(self, interaction: discord.Interaction,
+                                 creator: discord.User = None):
+        state = await require_ledger(interaction)
+        if state is None:
+            return
+        creator = creator or interaction.user
+        stats = state.ledger.creator_stats(creator.id)
+        if not stats["events"]:
+            await interaction.response.send_message(
+                f"{creator.mention} hasn't hosted any tracked events.",
+                ephemeral=True)
+            return
+
+        embed = discord.Embed(title=f"📊 Stats for {creator.display_name}",
+                              color=discord.Color.blue())
+        embed.add_field(name="Events hosted", value=stats["events"])
+        embed.add_field(name="Total joins", value=stats["joins"])
+        embed.add_field(name="Unique participants", value=stats["unique"])
+        embed.add_field(name="Average per event",
+                        value=f"{stats['joins'] / stats['events']:.1f}")
+        if stats["regulars"]:
+            embed.add_field(name="Regulars",
+                            value="\n".join(f"<@{user_id}> — {joins}"
+                                            for user_id, joins in stats["regulars"]),
+                            inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(
+        name="rolemessage",
+        description=
+        "Give the Participant role to users who ticked the first reaction")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        message_id="The ID of the message to scan for reactions")
+    async def rolemessage(self, interaction: discord.Interaction, message_id: str):
+        await interaction.response.defer(ephemeral=True)
+
+        channel = interaction.channel
+        try:
+            message = await channel.fetch_message(int(message_id))
+        except Exception as e:
+            await interaction.followup.send(f"❌ Failed to fetch message: {e}",
+                                            ephemeral=True)
+            return
+
+        role = participant_role(interaction.guild)
+        if not role:
+            await interaction.followup.send("❌ 'Participant' role not found.",
+                                            ephemeral=True)
+            return
+
+        if not message.reactions:
+            await interaction.followup.send("❌ No reactions found on the message.",
+                                            ephemeral=True)
+            return
+
+        first_reaction = message.reactions[0]
+        assigned_users = set()
+
+        async for user in first_reaction.users():
+            if user.bot:
+                continue
+            if await give_participant_role(interaction.guild, role, user.id):
+                assigned_users.add(user.id)
+
+        await interaction.followup.send(
+            f"✅ Assigned 'Participant' role to {len(assigned_users)} users who reacted to the message's first reaction.",
+            ephemeral=True)
+
+    @app_commands.command(
+        name="eventroler",
+        description="Send an Event Roler message to the current channel")
+    @staff_only()
+    @leader_only()
+    async def eventroler(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        # Send immediately
+        channel = interaction.channel
+
+        embed = discord.Embed(title="AFFIRM YES",
+                              description="This is for the event above",
+                              color=discord.Color.blue())
+
+        embed.add_field(
+            name="",
+            value=
+            "To participate in this event, tick the reaction below and you will be given the Participant role.",
+            inline=False)
+
+        embed.set_footer(text=f"Created by {interaction.user}")
+
+        message = await channel.send(embed=embed)
+        await message.add_reaction("\u2705")
+
+        await interaction.followup.send(
+            f"✅ 'AFFIRM YES' prompt sent to this channel.", ephemeral=True)
+
+
+async def setup(client):
+    global bot
+    bot = client
+    await bot.add_cog(Reactions(bot))
@@ -0,0 +1,904 @@
+"""Event creation, editing and announcement scheduling."""
+import discord
+from discord import app_commands
+from discord.ext import commands
+import asyncio
+import bisect
+from datetime import datetime, timedelta, timezone
+
+from zoneinfo import ZoneInfoNotFoundError
+
+from core import (DELETED_START, EMBED_DESCRIPTION_MAX, EMBED_FIELD_NAME_MAX,
+                  EMBED_FIELD_VALUE_MAX, cached_render, clip, format_local,
+                  github_budget, guild_configs, guild_state, guild_states,
+                  leader_autocomplete, leader_only, leading, ledger_meta,
+                  load_zone, paginate_embed, parse_start_time, participant_role,
+                  require_events, require_state, set_events, staff_only,
+                  storage, timezone_names, user_timezones, user_zone)
+
+bot = None  # Set in setup()
+
+
+def upcoming_events(state, now):
+    return sorted((e for e in state.events
+                   if not e.get("started") and e["start_time"] > now),
+                  key=lambda e: e["start_time"])
+
+
+def upcoming_fields(upcoming):
+    return [(e["name"],
+             f"Starts <t:{int(e['start_time'].timestamp())}:F>\nCreated by: <@{e['creator']['id']}>")
+            for e in upcoming]
+
+
+def render_event_information(state):
+    config = state.config
+
+    def build(now):
+        upcoming = upcoming_events(state, now)
+        description_text = (
+            "This channel is temporarily closed until an event is being held. It will reopen once the event starts.\n"
+            "If you have any questions about upcoming events, feel free to ping the host"
+        )
+        if config["help_channel_url"]:
+            description_text += f", DM them, or ask in ⁠{config['help_channel_url']}\n\n"
+        else:
+            description_text += " or DM them\n\n"
+        if upcoming:
+            description_text += "🗓️ **Current Upcoming Events:**"
+        else:
+            description_text += "🚫 **There are currently no upcoming events scheduled via the bot.**"
+
+        trailer = "Keep an eye out for future events in here"
+        if config["events_channel_url"]:
+            trailer += f" or ⁠{config['events_channel_url']}"
+        embeds = paginate_embed("🎉 Event Information",
+                                upcoming_fields(upcoming),
+                                discord.Color.orange(),
+                                description=description_text,
+                                trailer=("", trailer + "! 👀"))
+        return embeds, upcoming[0]["start_time"] if upcoming else None
+
+    return cached_render(state, "event_information", state.events_version,
+                         build)
+
+
+def build_announcement_embed(event):
+    embed = discord.Embed(title=clip(event["name"].upper(), 256),
+                          description=clip(event["info"],
+                                           EMBED_DESCRIPTION_MAX),
+                          color=discord.Color.blue())
+
+    if event.get("reward1"):
+        embed.add_field(name="\U0001F381 1st Place Reward",
+                        value=clip(event["reward1"], EMBED_FIELD_VALUE_MAX),
+                        inline=False)
+    if event.get("reward2"):
+        embed.add_field(name="\U0001F381 2nd Place Reward",
+                        value=clip(event["reward2"], EMBED_FIELD_VALUE_MAX),
+                        inline=False)
+    if event.get("reward3"):
+        embed.add_field(name="\U0001F381 3rd Place Reward",
+                        value=clip(event["reward3"], EMBED_FIELD_VALUE_MAX),
+                        inline=False)
+    if event.get("participation_reward"):
+        embed.add_field(name="\U0001F381 Participation Reward",
+                        value=clip(event["participation_reward"],
+                                   EMBED_FIELD_VALUE_MAX),
+                        inline=False)
+
+    embed.add_field(
+        name="",
+        value=
+        "To participate in this event, tick the reaction below and you will be given the Participant role.",
+        inline=False)
+
+    embed.set_footer(text=f"Created by {event['creator']['name']}")
+    return embed
+
+
+
+# --- UPCOMING EVENTS INDEX ---
+# Sorted (start timestamp, event index) keys, rebuilt once per events_version.
+# Pages are located with bisect, so only the requested page is materialized.
+LIST_PAGE_SIZE = 10
+SELECT_PAGE_SIZE = 25  # Discord's cap on select menu options
+
+
+def upcoming_keys(state, creator_id=None):
+    index = state.upcoming_index
+    if index["version"] != state.events_version:
+        keys, by_creator = [], {}
+        for idx, e in enumerate(state.events):
+            if e.get("started") or not isinstance(e["start_time"], datetime):
+                continue
+            key = (e["start_time"].timestamp(), idx)
+            keys.append(key)
+            by_creator.setdefault(e["creator"]["id"], []).append(key)
+        keys.sort()
+        for creator_keys in by_creator.values():
+            creator_keys.sort()
+        index.update(version=state.events_version,
+                     all=keys,
+                     by_creator=by_creator)
+    if creator_id is None:
+        return index["all"]
+    return index["by_creator"].get(creator_id, [])
+
+
+class UpcomingCursor:
+    """Cursor over a guild's upcoming-events index, optionally scoped to one creator.
+
+    The cursor remembers the key of the first entry on the current page rather
+    than an offset, so it stays correct if the index is rebuilt between clicks.
+    """
+
+    def __init__(self, state, creator_id=None, page_size=LIST_PAGE_SIZE):
+        self.state = state
+        self.creator_id = creator_id
+        self.page_size = page_size
+        self.first_key = None
+
+    def bounds(self):
+        keys = upcoming_keys(self.state, self.creator_id)
+        now = datetime.now(tz=timezone.utc).timestamp()
+        lower = bisect.bisect_right(keys, (now, float("inf")))
+        start = lower if self.first_key is None else max(
+            lower, bisect.bisect_left(keys, self.first_key))
+        if start >= len(keys) and start > lower:
+            start = max(lower, len(keys) - self.page_size)
+        return keys, lower, start
+
+    def page(self):
+        """Return [(event index, event)] for the current page."""
+        keys, lower, start = self.bounds()
+        return [(idx, self.state.events[idx])
+                for _, idx in keys[start:start + self.page_size]]
+
+    def has_previous(self):
+        keys, lower, start = self.bounds()
+        return start > lower
+
+    def has_next(self):
+        keys, lower, start = self.bounds()
+        return start + self.page_size < len(keys)
+
+    def next(self):
+        keys, lower, start = self.bounds()
+        if start + self.page_size < len(keys):
+            self.first_key = keys[start + self.page_size]
+
+    def previous(self):
+        keys, lower, start = self.bounds()
+        self.first_key = keys[max(lower, start - self.page_size)] if lower < len(keys) else None
+
+    def position(self):
+        """Return (page number, page count) for display."""
+        keys, lower, start = self.bounds()
+        total = max(1, -(-(len(keys) - lower) // self.page_size))
+        return (start - lower) // self.page_size + 1, total
+
+
+def render_upcoming_page(cursor):
+    page = cursor.page()
+    if not page:
+        return None
+    embed = discord.Embed(title="📅 Upcoming Events",
+                          color=discord.Color.green())
+    for name, value in upcoming_fields([e for _, e in page]):
+        embed.add_field(name=clip(name, EMBED_FIELD_NAME_MAX),
+                        value=value,
+                        inline=False)
+    number, total = cursor.position()
+    if total > 1:
+        embed.set_footer(text=f"Page {number}/{total}")
+    return embed
+
+
+class UpcomingEventsView(discord.ui.View):
+    """Previous/next buttons that render one page of upcoming events at a time."""
+
+    def __init__(self, cursor):
+        super().__init__(timeout=180)
+        self.cursor = cursor
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = not self.cursor.has_previous()
+        self.next.disabled = not self.cursor.has_next()
+
+    async def show(self, interaction):
+        embed = render_upcoming_page(self.cursor)
+        self.update_buttons()
+        if embed is None:
+            await interaction.response.edit_message(
+                content="There are no upcoming events planned.",
+                embed=None,
+                view=None)
+            return
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        self.cursor.previous()
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        self.cursor.next()
+        await self.show(interaction)
+
+
+class EventPickerView(discord.ui.View):
+    """A select menu over one creator's upcoming events, 25 per page."""
+
+    def __init__(self, state, creator_id, placeholder, on_pick):
+        super().__init__(timeout=60)
+        self.cursor = UpcomingCursor(state,
+                                     creator_id=creator_id,
+                                     page_size=SELECT_PAGE_SIZE)
+        self.on_pick = on_pick
+        self.select = discord.ui.Select(placeholder=placeholder)
+        self.select.callback = self.picked
+        self.add_item(self.select)
+        self.update_items()
+
+    def update_items(self):
+        self.select.options = [
+            discord.SelectOption(label=clip(e["name"], 100), value=str(idx))
+            for idx, e in self.cursor.page()
+        ]
+        self.previous.disabled = not self.cursor.has_previous()
+        self.next.disabled = not self.cursor.has_next()
+
+    def is_empty(self):
+        return not self.select.options
+
+    async def picked(self, interaction):
+        await self.on_pick(interaction, int(self.select.values[0]))
+
+    async def show(self, interaction):
+        self.update_items()
+        if self.is_empty():
+            await interaction.response.edit_message(
+                content="You have no upcoming events.", view=None)
+            return
+        await interaction.response.edit_message(view=self)
+
+    @discord.ui.button(label="◀ Previous",
+                       style=discord.ButtonStyle.secondary,
+                       row=1)
+    async def previous(self, interaction, button):
+        self.cursor.previous()
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary, row=1)
+    async def next(self, interaction, button):
+        self.cursor.next()
+        await self.show(interaction)
+
+
+
+@leader_autocomplete
+async def own_event_autocomplete(interaction: discord.Interaction,
+                                 current: str):
+    state = guild_state(interaction.guild_id)
+    if state is None:
+        return []
+    choices = []
+    for index in state.name_index.search(interaction.user.id, current):
+        event = own_upcoming_event(state, index, interaction.user.id)
+        if event is None:
+            continue
+        label = f"{event['name']} — {event['start_time']:%d %b %H:%M} UTC"
+        choices.append(app_commands.Choice(name=clip(label, 100),
+                                           value=str(index)))
+    return choices
+
+
+@leader_autocomplete
+async def timezone_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower().replace(" ", "_")
+    return [app_commands.Choice(name=name, value=name)
+            for name in timezone_names() if current in name.lower()][:25]
+
+
+def resolve_own_event(state, value, user_id):
+    """Resolve an autocompleted event argument to (index, event), or (None, None)."""
+    if value.isdigit():
+        index = int(value)
+        event = own_upcoming_event(state, index, user_id)
+        if event is not None:
+            return index, event
+    # Typed without picking a suggestion: accept an exact name match
+    for index in state.name_index.search(user_id, value):
+        event = own_upcoming_event(state, index, user_id)
+        if event is not None and event["name"].lower() == value.lower().strip():
+            return index, event
+    return None, None
+
+
+async def announce_event(state, event):
+    now = datetime.now(tz=timezone.utc)
+    delay = (event["start_time"] - now).total_seconds()
+    embed = build_announcement_embed(event)  # Prebuilt so the post goes out immediately
+    try:
+        if delay > 0:
+            await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        print(f"🛑 Announcement task for '{event['name']}' was cancelled.")
+        return  # Stop further execution if cancelled
+
+    if not leading():
+        return  # Another replica took over while we slept
+
+    guild = bot.get_guild(state.guild_id)
+    if guild is None:
+        print(f"Failed to get guild {state.guild_id} for event {event['name']}")
+        return
+
+    # Use provided channel if available, otherwise default to first available
+    channel = guild.get_channel(event.get("channel_id"))
+    if channel is None:
+        print(
+            f"Fallback: no stored channel for event {event['name']}, using first available."
+        )
+        channel = next((ch for ch in guild.text_channels
+                        if ch.permissions_for(guild.me).send_messages), None)
+
+    if channel is None:
+        print(f"No suitable channel found for event {event['name']}")
+        return
+    event["channel_id"] = channel.id
+
+    announce_role_id = state.config["announce_role_id"]
+    if announce_role_id:
+        await channel.send(f"<@&{announce_role_id}>",
+                           allowed_mentions=discord.AllowedMentions(roles=True))
+
+    message = await channel.send(embed=embed)
+    await message.add_reaction("\u2705")
+
+    # Reactions on this message are recorded in the participation ledger
+    event["message_id"] = message.id
+    if state.ledger is not None:
+        state.ledger.track(message.id, ledger_meta(event))
+
+    event["started"] = True
+    await storage(bot).save_events(state)
+    print(f"Event announced: {event['name']}")
+
+
+async def schedule_upcoming_events(state, missed=0):
+    """Schedule every unstarted event still to come. With missed, events that
+    were due up to that many seconds ago are announced right away too."""
+    if not leading():
+        return
+    now = datetime.now(tz=timezone.utc)
+    cutoff = now - timedelta(seconds=missed)
+
+    for idx, event in enumerate(state.events):
+        if isinstance(event["start_time"], str):
+            event["start_time"] = datetime.fromisoformat(event["start_time"])
+
+        if not event.get("started", False) and event["start_time"] > cutoff:
+            # Cancel any previously scheduled task for this index
+            existing_task = state.scheduled_tasks.get(idx)
+            if existing_task and not existing_task.done():
+                existing_task.cancel()
+                print(f"❌ Cancelled previous task for event {event['name']}")
+
+            # Schedule new task
+            task = asyncio.create_task(announce_event(state, event))
+            state.scheduled_tasks[idx] = task
+            print(f"✅ Scheduled announcement for {event['name']}")
+
+
+def schedule_events(state, indices):
+    """Schedule announcements for just these events, leaving all others untouched."""
+    for idx in indices:
+        existing_task = state.scheduled_tasks.get(idx)
+        if existing_task and not existing_task.done():
+            existing_task.cancel()
+        state.scheduled_tasks[idx] = asyncio.create_task(
+            announce_event(state, state.events[idx]))
+
+
+def cancel_scheduled(state):
+    for task in state.scheduled_tasks.values():
+        if not task.done():
+            task.cancel()
+    state.scheduled_tasks.clear()
+
+
+async def periodic_event_sync(state):
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        changed = False
+        if github_budget.allow_poll():
+            print(f"🔄 Checking GitHub for event updates (guild {state.guild_id})...")
+            new_events = None
+            try:
+                async with state.events_lock:
+                    version = state.events_version
+                    # Fetch off the event loop so other guilds aren't held up
+                    new_events = await asyncio.to_thread(storage(bot).load_events, state, "poll")
+            except RuntimeError as e:
+                # Keep the events we have; an empty list would be saved over GitHub's
+                print(f"❌ {e}")
+            if version != state.events_version:
+                # Changed here during the fetch, so the fetched list is already
+                # stale; that change's save waits on the lock and the next poll sees it
+                new_events = None
+            if new_events is not None:
+                # Overwrite in-memory event list (caches are only invalidated on change)
+                changed = set_events(state, new_events)
+                state.events_loaded = True
+
+                # Reschedule announcements (followers only keep their cache fresh)
+                await schedule_upcoming_events(state)
+        else:
+            print(f"⏸️ Skipping event poll for guild {state.guild_id}, GitHub budget is low.")
+
+        if state.ledger is None:
+            try:
+                state.ledger = await asyncio.to_thread(storage(bot).load_ledger, state)
+                state.ledger_ready.set()
+            except RuntimeError as e:
+                print(f"❌ {e}")  # Reactions wait for the ledger; retry next pass
+
+        # Write out participation recorded since the last pass
+        await storage(bot).flush_ledger(state)
+
+        await asyncio.sleep(github_budget.next_interval(state.guild_id, changed))
+
+
+def start_guild(state):
+    if state.sync_task is None or state.sync_task.done():
+        state.sync_task = bot.loop.create_task(periodic_event_sync(state))
+
+
+class EditEventModal(discord.ui.Modal, title="Edit Event"):
+
+    def __init__(self, state, index, event):
+        super().__init__()
+        self.state = state
+        self.index = index
+        self.event = event
+        self.name = discord.ui.TextInput(label="Event Name",
+                                         default=event["name"])
+        self.info = discord.ui.TextInput(label="Description",
+                                         default=event["info"],
+                                         style=discord.TextStyle.paragraph)
+        self.tz = user_zone(event["creator"]["id"])
+        self.start = discord.ui.TextInput(
+            label="Start time (e.g. 2025-06-01 19:00 or 1d2h)",
+            default=format_local(event["start_time"], self.tz),
+            required=False)
+        self.participation = discord.ui.TextInput(
+            label="Participation Reward",
+            default=event.get("participation_reward", ""),
+            required=False)
+        for item in (self.name, self.info, self.start, self.participation):
+            self.add_item(item)
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        state, event = self.state, self.event
+        start_time = event["start_time"]
+        text = self.start.value.strip()
+        if text and text != self.start.default:
+            now = datetime.now(tz=timezone.utc)
+            try:
+                start_time = parse_start_time(text, self.tz, now)
+            except ValueError as e:
+                await modal_interaction.response.send_message(
+                    f"❌ {e}", ephemeral=True)
+                return
+            if start_time < now:
+                await modal_interaction.response.send_message(
+                    "❌ That time is in the past.", ephemeral=True)
+                return
+
+        event["name"] = self.name.value
+        event["info"] = self.info.value
+        event["participation_reward"] = self.participation.value
+        event["start_time"] = start_time
+
+        # Update the event in the main list and save
+        state.events[self.index] = event
+        state.name_index.add(self.index, event)
+        await modal_interaction.response.send_message(
+            f"✅ Event **{event['name']}** has been updated!", ephemeral=True)
+        await storage(bot).save_events(state)
+        # Only this event's announcement moves; the others keep their tasks
+        if not event.get("started"):
+            schedule_events(state, [self.index])
+
+
+class ConfirmDeleteModal(discord.ui.Modal, title="Confirm Delete Event"):
+    confirm = discord.ui.TextInput(label="Type DELETE to confirm",
+                                   placeholder="DELETE",
+                                   required=True)
+
+    def __init__(self, state, index, event):
+        super().__init__()
+        self.state = state
+        self.index = index
+        self.event = event
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        state, event = self.state, self.event
+        if self.confirm.value.strip().upper() != "DELETE":
+            await modal_interaction.response.send_message(
+                "❌ Deletion cancelled.", ephemeral=True)
+            return
+
+        # Mark as deleted: a fixed past start, serialized when the events are saved
+        event["start_time"] = DELETED_START
+        state.events[self.index] = event
+        state.name_index.remove(self.index)
+
+        # Cancel existing scheduled task
+        task = state.scheduled_tasks.get(self.index)
+        if task and not task.done():
+            task.cancel()
+            print(f"🛑 Cancelled announcement for deleted event '{event['name']}'")
+
+        await modal_interaction.response.send_message(
+            f"🗑️ Event **{event['name']}** has been marked as deleted.",
+            ephemeral=True)
+        await storage(bot).save_events(state)
+
+
+def own_upcoming_event(state, index, user_id):
+    """Return the event at index if it's an upcoming event created by user_id."""
+    if not 0 <= index < len(state.events):
+        return None
+    event = state.events[index]
+    start = event.get("start_time")
+    if (event.get("started") or event["creator"]["id"] != user_id
+            or not isinstance(start, datetime)
+            or start <= datetime.now(tz=timezone.utc)):
+        return None
+    return event
+
+
+class Scheduler(commands.Cog):
+
+    schedule_events = staticmethod(schedule_events)
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        if self.bot.is_ready():  # Reloaded: on_ready won't fire again
+            for state in guild_states.values():
+                start_guild(state)
+
+    async def cog_unload(self):
+        # Only the sync loops are stopped. Announcement tasks already scheduled
+        # keep running, and the restarted loop's first pass reschedules them
+        # with the reloaded code.
+        for state in guild_states.values():
+            if state.sync_task:
+                state.sync_task.cancel()
+                state.sync_task = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild_id in guild_configs:
+            start_guild(guild_state(guild_id))
+
+    @commands.Cog.listener()
+    async def on_guild_configured(self, state):
+        start_guild(state)
+
+    @commands.Cog.listener()
+    async def on_leadership_change(self, leader):
+        for state in guild_states.values():
+            if leader:
+                # Events due while no replica held the lease were never announced
+                await schedule_upcoming_events(state, storage(bot).lease_ttl())
+            else:
+                cancel_scheduled(state)
+
+    @app_commands.command(name="editevent",
+                      description="Edit one of your scheduled events")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(event="The event to edit (leave empty to pick from a list)")
+    @app_commands.autocomplete(event=own_event_autocomplete)
+    async def editevent(self, interaction: discord.Interaction, event: str = None):
+        state = await require_state(interaction)
+        if state is None:
+            return
+
+        if event:
+            index, selected = resolve_own_event(state, event, interaction.user.id)
+            if selected is None:
+                await interaction.response.send_message(
+                    "❌ You have no upcoming event with that name.", ephemeral=True)
+                return
+            await interaction.response.send_modal(
+                EditEventModal(state, index, selected))
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        async def on_pick(select_interaction, index):
+            event = own_upcoming_event(state, index, select_interaction.user.id)
+            if event is None:
+                await select_interaction.response.send_message(
+                    "❌ That event can no longer be edited.", ephemeral=True)
+                return
+            await select_interaction.response.send_modal(
+                EditEventModal(state, index, event))
+
+        view = EventPickerView(state, interaction.user.id,
+                               "Choose an event to edit", on_pick)
+        if view.is_empty():
+            await interaction.followup.send("You have no upcoming events to edit.",
+                                            ephemeral=True)
+            return
+
+        await interaction.followup.send("Select the event to edit:",
+                                        view=view,
+                                        ephemeral=True)
+
+    @app_commands.command(name="deleteevent",
+                      description="Mark one of your upcoming events as deleted")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        event="The event to delete (leave empty to pick from a list)")
+    @app_commands.autocomplete(event=own_event_autocomplete)
+    async def deleteevent(self, interaction: discord.Interaction, event: str = None):
+        state = await require_state(interaction)
+        if state is None:
+            return
+
+        if event:
+            index, selected = resolve_own_event(state, event, interaction.user.id)
+            if selected is None:
+                await interaction.response.send_message(
+                    "❌ You have no upcoming event with that name.", ephemeral=True)
+                return
+            await interaction.response.send_modal(
+                ConfirmDeleteModal(state, index, selected))
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        async def on_pick(select_interaction, index):
+            event = own_upcoming_event(state, index, select_interaction.user.id)
+            if event is None:
+                await select_interaction.response.send_message(
+                    "❌ That event can no longer be deleted.", ephemeral=True)
+                return
+            await select_interaction.response.send_modal(
+                ConfirmDeleteModal(state, index, event))
+
+        view = EventPickerView(state, interaction.user.id,
+                               "Choose an event to delete", on_pick)
+        if view.is_empty():
+            await interaction.followup.send(
+                "You have no upcoming events to delete.", ephemeral=True)
+            return
+
+        await interaction.followup.send("Select the event to delete:",
+                                        view=view,
+                                        ephemeral=True)
+
+    @app_commands.command(name="createevent", description="Create an event")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        delay="When it starts: 30m, 1d2h30m, 2025-06-01 19:00, 19:30 or a <t:…> timestamp")
+    async def createevent(self, interaction: discord.Interaction,
+                                name: str,
+                                info: str,
+                                delay: str = "0s",
+                                reward1: str = "",
+                                reward2: str = "",
+                                reward3: str = "",
+                                participation_reward: str = ""):
+        state = await require_events(interaction)
+        if state is None:
+            return
+
+        now = datetime.now(tz=timezone.utc)
+        try:
+            start_time = parse_start_time(delay, user_zone(interaction.user.id),
+                                          now)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+        if start_time < now:
+            await interaction.response.send_message(
+                "❌ That time is in the past.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)  # ✅ Always defer quickly
+
+        creator = {"id": interaction.user.id, "name": str(interaction.user)}
+
+        event_data = {
+            "name": name,
+            "info": info,
+            "reward1": reward1,
+            "reward2": reward2,
+            "reward3": reward3,
+            "participation_reward": participation_reward,
+            "start_time": start_time,
+            "started": False,
+            "creator": creator,
+            "channel_id": interaction.channel_id
+        }
+
+        state.events.append(event_data)
+        idx = len(state.events) - 1  # Index of the new event
+        state.name_index.add(idx, event_data)
+        await storage(bot).save_events(state)
+
+        # Schedule with tracking
+        schedule_events(state, [idx])
+
+        if start_time > now:
+            ts = int(start_time.timestamp())
+            await interaction.followup.send(
+                f"⏳ Event '{name}' will be posted <t:{ts}:R> (<t:{ts}:F>).")
+        else:
+            await interaction.followup.send(f"✅ Event '{name}' has been posted!")
+
+    @app_commands.command(
+        name="end",
+        description="Sends the event info and clears the Participant role")
+    @staff_only()
+    @leader_only()
+    async def end(self, interaction: discord.Interaction):
+        state = await require_state(interaction)
+        if state is None:
+            return
+
+        await interaction.response.send_message(
+            "Ending event and removing Participant role.", ephemeral=True)
+
+        # Announcements so far no longer grant the role when reconciling
+        for event in state.events:
+            if event.get("started") and event.get("message_id"):
+                event["ended"] = True
+        state.role_ops.clear()
+        await storage(bot).save_events(state)
+
+        # Remove "Participant" role from everyone who has it
+        guild = interaction.guild
+        role = participant_role(guild)
+        reactions = self.bot.get_cog("Reactions")
+        if role:
+            for user_id in reactions.participant_holders(guild, role):
+                try:
+                    await reactions.take_participant_role(guild, role, user_id,
+                                                          reason="Event ended")
+                    print(f"Removed Participant role from {user_id}")
+                except Exception as e:
+                    print(f"Failed to remove role from {user_id}: {e}")
+        else:
+            print("Participant role not found.")
+
+        # Send the (cached) event information, one message per page
+        for embed in render_event_information(state):
+            try:
+                await interaction.channel.send(embed=embed)
+            except discord.InteractionResponded:
+                pass
+
+    @app_commands.command(
+        name="eventping",
+        description="Ping the Event Notifier role"
+    )
+    @staff_only()
+    @leader_only()
+    async def eventping(self, interaction: discord.Interaction):
+        role_id = guild_configs[interaction.guild_id]["notifier_role_id"]
+        role = interaction.guild.get_role(role_id) if role_id else None
+        if role is None:
+            await interaction.response.send_message(
+                "❌ Event Notifier role not found. Check the ID.", ephemeral=True
+            )
+            return
+
+        # Send an ephemeral confirmation to staff first
+        await interaction.response.send_message("✅ Event ping sent!", ephemeral=True)
+
+        # Then send the actual ping to the channel
+        await interaction.followup.send(f"{role.mention}", allowed_mentions=discord.AllowedMentions(roles=True))
+
+    @app_commands.command(
+        name="participantping",
+        description="Ping the Participant role"
+    )
+    @staff_only()
+    @leader_only()
+    async def participantping(self, interaction: discord.Interaction):
+        role_id = guild_configs[interaction.guild_id]["participant_role_id"]
+        role = interaction.guild.get_role(role_id) if role_id else None
+        if role is None:
+            await interaction.response.send_message(
+                "❌ Participant role not found. Check the ID.", ephemeral=True
+            )
+            return
+
+        # Confirm to staff privately
+        await interaction.response.send_message("✅ Participant ping sent!", ephemeral=True)
+
+        # Send actual ping to the channel
+        await interaction.followup.send(
+            f"{role.mention}",
+            allowed_mentions=discord.AllowedMentions(roles=True)
+        )
+
+    @app_commands.command(
+        name="timezone",
+        description="Set the timezone your event start times are read in")
+    @staff_only()
+    @leader_only()
+    @app_commands.describe(
+        zone="IANA timezone, e.g. Europe/London (leave empty to see yours)")
+    @app_commands.autocomplete(zone=timezone_autocomplete)
+    async def timezone_command(self, interaction: discord.Interaction,
+                               zone: str = None):
+        user_id = interaction.user.id
+        if zone is None:
+            tz = user_zone(user_id)
+            await interaction.response.send_message(
+                f"🕒 Your start times are read in **{tz}** "
+                f"(now {format_local(datetime.now(tz=timezone.utc), tz)}).",
+                ephemeral=True)
+            return
+
+        try:
+            tz = load_zone(zone.strip())
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.response.send_message(
+                f"❌ Unknown timezone '{zone}'. Pick one from the list, e.g. Europe/London.",
+                ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        timezones = await asyncio.to_thread(storage(bot).save_timezone, user_id,
+                                            tz.key)
+        if timezones is None:
+            await interaction.followup.send(
+                "❌ Couldn't save your timezone, please try again.", ephemeral=True)
+            return
+        user_timezones.update(timezones)
+        await interaction.followup.send(
+            f"✅ Timezone set to **{tz.key}** "
+            f"(now {format_local(datetime.now(tz=timezone.utc), tz)}).",
+            ephemeral=True)
+
+    @app_commands.command(name="events", description="Shows all upcoming events")
+    @leader_only()
+    async def events_command(self, interaction: discord.Interaction):
+        state = await require_state(interaction)
+        if state is None:
+            return
+
+        cursor = UpcomingCursor(state)
+        embed = render_upcoming_page(cursor)
+        if embed is None:
+            await interaction.response.send_message(
+                "There are no upcoming events planned.")
+            return
+
+        if cursor.has_next():
+            await interaction.response.send_message(
+                embed=embed, view=UpcomingEventsView(cursor))
+        else:
+            await interaction.response.send_message(embed=embed)
+
+
+async def setup(client):
+    global bot
+    bot = client
+    await bot.add_cog(Scheduler(bot))
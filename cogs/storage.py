@@ -0,0 +1,568 @@
+"""GitHub-backed storage, guild configs and the leader lease."""
+import discord
+from discord import app_commands
+from discord.ext import commands
+import os
+import json
+import time
+import asyncio
+import base64
+import io
+import fcntl
+import socket
+import sqlite3
+from datetime import datetime
+import requests
+
+import core
+from core import (bump_events_version, github_budget, github_etags,
+                  guild_configs, guild_state, guild_states, leader_only,
+                  leading, stored_form, user_timezones, with_defaults,
+                  ParticipationLedger, ledger_meta)
+
+GUILD_CONFIG_FILE = "guilds.json"
+TIMEZONES_FILE = "timezones.json"
+GITHUB_CONTENTS_URL = "https://api.github.com/repos/CuriousWonder1/Discord-bot/contents/"
+
+bot = None  # Set in setup()
+
+
+# --- GITHUB STORAGE ---
+def github_headers():
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        return None
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+
+def fetch_github_file(path, kind="read"):
+    """Return (decoded JSON, blob SHA) for a file in the data repo, or (None, None)
+    if it doesn't exist. Raises RuntimeError if GitHub can't be read (rate limit,
+    outage), so callers don't mistake a failed read for an empty file."""
+    headers = github_headers()
+    if headers is None:
+        print(f"❌ GITHUB_TOKEN not set! Can't read {path}.")
+        return None, None
+
+    cached = github_etags.get(path)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+    response = requests.get(GITHUB_CONTENTS_URL + path, headers=headers)
+    github_budget.observe(response, kind)
+    if response.status_code == 304:
+        return json.loads(cached[1]), cached[2]
+    if response.status_code == 200:
+        text = base64.b64decode(response.json()["content"]).decode()
+        sha = response.json().get("sha")
+        if response.headers.get("ETag"):
+            github_etags[path] = (response.headers["ETag"], text, sha)
+        return json.loads(text), sha
+    if response.status_code != 404:
+        raise RuntimeError(
+            f"Failed to fetch {path}: {response.status_code} {response.text}")
+    return None, None
+
+
+def stream_github_file(path, kind="read"):
+    """Open a file in the data repo as a text stream, without holding it all in
+    memory. Returns None if the file doesn't exist."""
+    headers = github_headers()
+    if headers is None:
+        raise RuntimeError(f"GITHUB_TOKEN not set! Can't read {path}.")
+    headers["Accept"] = "application/vnd.github.raw+json"
+    response = requests.get(GITHUB_CONTENTS_URL + path,
+                            headers=headers,
+                            stream=True)
+    github_budget.observe(response, kind)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"Failed to fetch {path}: {response.status_code} {response.text}")
+    response.raw.decode_content = True
+    return io.TextIOWrapper(response.raw, encoding="utf-8")
+
+
+def put_github_file(path, data, sha, message, indent=4, kind="write"):
+    """Write a file only if it is still at sha (None creates it).
+
+    Returns the new SHA, or None if someone else committed first.
+    """
+    headers = github_headers()
+    if headers is None:
+        raise RuntimeError(f"GITHUB_TOKEN not set! Can't write {path}.")
+    content = base64.b64encode(json.dumps(data,
+                                          indent=indent).encode()).decode()
+    payload = {"message": message, "content": content, "branch": "main"}
+    if sha:
+        payload["sha"] = sha
+    put_resp = requests.put(GITHUB_CONTENTS_URL + path,
+                            headers=headers,
+                            json=payload)
+    github_budget.observe(put_resp, kind)
+    github_etags.pop(path, None)
+    if put_resp.status_code in (200, 201):
+        print(f"✅ {path} updated on GitHub.")
+        return put_resp.json()["content"]["sha"]
+    if put_resp.status_code in (409, 422):  # GitHub's answer to a stale sha
+        print(f"⚠️ {path} changed underneath us.")
+        return None
+    raise RuntimeError(
+        f"Failed to update {path}: {put_resp.status_code} {put_resp.text}")
+
+
+def commit_github_file(path, data, message, indent=4, retries=3):
+    """Overwrite a file with whatever SHA it currently has (last write wins).
+
+    Returns True once written, False if GitHub failed or kept changing underneath.
+    """
+    try:
+        for _ in range(retries):
+            _, sha = fetch_github_file(path, kind="write")
+            if put_github_file(path, data, sha, message, indent=indent):
+                return True
+    except RuntimeError as e:
+        print(f"❌ {e}")
+    return False
+
+
+def update_github_file(path, change, message, indent=4, retries=5):
+    """Apply change to a file's current contents and write it back with
+    compare-and-swap, refetching and reapplying it if another writer got there first.
+
+    change edits the decoded JSON (a dict, {} if the file is new) in place.
+    Returns the data as written, or None if it couldn't be written.
+    """
+    try:
+        for _ in range(retries):
+            data, sha = fetch_github_file(path, kind="write")
+            data = data or {}
+            change(data)
+            if put_github_file(path, data, sha, message, indent=indent):
+                return data
+    except RuntimeError as e:
+        print(f"❌ {e}")
+    return None
+
+
+# --- GUILD CONFIG ---
+def configs_from_json(raw):
+    return {
+        int(guild_id): with_defaults(guild_id, config)
+        for guild_id, config in raw.items()
+    }
+
+
+def load_guild_configs():
+    """Per-guild settings keyed by guild ID, from GitHub or the bundled guilds.json."""
+    raw, _ = fetch_github_file(GUILD_CONFIG_FILE)
+    if raw is None:
+        try:
+            with open(GUILD_CONFIG_FILE) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            print(f"⚠️ No {GUILD_CONFIG_FILE} found, no guilds configured.")
+            raw = {}
+    return configs_from_json(raw)
+
+
+def save_guild_config(guild_id, apply):
+    """Apply a change to one guild's config as stored on GitHub, leaving the
+    other guilds' entries as they are there. Returns every guild's config as
+    written, or None if it couldn't be saved."""
+
+    def change(data):
+        config = with_defaults(guild_id, data.get(str(guild_id), {}))
+        apply(config)
+        data[str(guild_id)] = config
+
+    data = update_github_file(GUILD_CONFIG_FILE, change, "Update guild config",
+                              indent=2)
+    if data is None:
+        return None
+    with open(GUILD_CONFIG_FILE, "w") as f:
+        json.dump(data, f, indent=2)
+    return configs_from_json(data)
+
+
+def merge_guild_configs(configs):
+    """Take in freshly read configs. Returns the IDs of guilds that are new here."""
+    added = configs.keys() - guild_configs.keys()
+    for guild_id, config in configs.items():
+        state = guild_states.get(guild_id)
+        if state and guild_configs.get(guild_id) != config:
+            state.render_cache.clear()  # Rendered with the old roles and links
+    guild_configs.update(configs)
+    return added
+
+
+def timezones_from_json(data):
+    return {int(user_id): name for user_id, name in (data or {}).items()}
+
+
+def load_timezones():
+    """Each creator's timezone for reading start times, keyed by user ID."""
+    data, _ = fetch_github_file(TIMEZONES_FILE)
+    return timezones_from_json(data)
+
+
+def save_timezone(user_id, name):
+    """Set one user's timezone on GitHub, keeping everyone else's as stored there.
+
+    Returns every user's timezone as written, or None if it couldn't be saved.
+    """
+
+    def change(data):
+        data[str(user_id)] = name
+
+    data = update_github_file(TIMEZONES_FILE, change, "Update timezones", indent=2)
+    return None if data is None else timezones_from_json(data)
+
+
+# --- LEADER LEASE ---
+# With several replicas running, only the one holding the lease schedules
+# announcements, writes to storage and answers commands; the others keep
+# their caches in sync to take over. Pick a backend with LEASE_BACKEND.
+LEASE_TTL = int(os.getenv("LEASE_TTL", 90))  # Seconds a lease stays valid without renewal
+LEASE_RENEW = LEASE_TTL // 3
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def lease_free(lease, holder, now):
+    return lease.get("holder") in (None, holder) or lease.get("expires_at", 0) <= now
+
+
+class FileLease:
+    """Lease record in a local JSON file, for replicas sharing one host."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self, holder, ttl):
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+            f.seek(0)
+            raw = f.read()
+            now = time.time()
+            if not lease_free(json.loads(raw) if raw else {}, holder, now):
+                return False
+            f.seek(0)
+            f.truncate()
+            json.dump({"holder": holder, "expires_at": now + ttl}, f)
+            return True
+
+
+class SQLiteLease:
+    """Lease row in a SQLite database, taken with a single conditional UPDATE."""
+
+    def __init__(self, path, name="leader"):
+        self.path = path
+        self.name = name
+
+    def acquire(self, holder, ttl):
+        now = time.time()
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, holder TEXT, expires_at REAL)"
+                )
+                db.execute("INSERT OR IGNORE INTO lease VALUES (?, ?, ?)",
+                           (self.name, holder, now + ttl))
+                cursor = db.execute(
+                    "UPDATE lease SET holder = ?, expires_at = ? "
+                    "WHERE name = ? AND (holder = ? OR expires_at <= ?)",
+                    (holder, now + ttl, self.name, holder, now))
+                return cursor.rowcount == 1
+        finally:
+            db.close()
+
+
+class GitHubLease:
+    """Lease record in the data repo, taken with compare-and-swap on the file SHA.
+
+    Expiry uses each replica's wall clock, so keep LEASE_TTL well above any clock skew.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self, holder, ttl):
+        lease, sha = fetch_github_file(self.path, kind="lease")
+        now = time.time()
+        if not lease_free(lease or {}, holder, now):
+            return False
+        return put_github_file(self.path, {
+            "holder": holder,
+            "expires_at": now + ttl
+        },
+                               sha,
+                               "Renew leader lease",
+                               indent=2,
+                               kind="lease") is not None
+
+
+def make_lease_backend():
+    backend = os.getenv("LEASE_BACKEND", "").lower()
+    if backend == "file":
+        return FileLease(os.getenv("LEASE_PATH", "leader.lock"))
+    if backend == "sqlite":
+        return SQLiteLease(os.getenv("LEASE_PATH", "leader.db"))
+    if backend == "github":
+        return GitHubLease(os.getenv("LEASE_PATH", "leader.json"))
+    return None  # Single replica: always the leader
+
+
+async def hold_lease():
+    """Acquire or renew the lease every LEASE_RENEW seconds, and tell the other
+    extensions (via on_leadership_change) when leadership changes hands."""
+    if core.lease_backend is None:
+        return
+    await bot.wait_until_ready()
+    leader = leading()  # What the other extensions were last told
+    while not bot.is_closed():
+        started = time.time()
+        try:
+            acquired = await asyncio.to_thread(core.lease_backend.acquire,
+                                               REPLICA_ID, LEASE_TTL)
+        except Exception as e:
+            # The lease may still be ours; keep leader_until and let it run out
+            print(f"❌ Lease renewal failed: {e}")
+        else:
+            core.leader_until = started + LEASE_TTL if acquired else 0.0
+
+        if leading() and not leader:
+            leader = True
+            print(f"👑 {REPLICA_ID} is now the leader.")
+            for state in guild_states.values():
+                # A follower's ledger missed what the old leader recorded; drop
+                # it so the sync loop reloads it before anything flushes or
+                # reconciles against it
+                state.ledger = None
+                state.ledger_ready.clear()
+            bot.dispatch("leadership_change", True)
+        elif leader and not leading():
+            leader = False
+            print(f"⚠️ {REPLICA_ID} lost the lease, following.")
+            bot.dispatch("leadership_change", False)
+
+        await asyncio.sleep(LEASE_RENEW)
+
+
+def fetch_github_events(state, kind="read"):
+    data, _ = fetch_github_file(state.config["events_file"], kind)
+    return data or []
+
+
+def events_json(data):
+    return [{
+        **e, "start_time":
+        e["start_time"].isoformat()
+        if isinstance(e["start_time"], datetime) else e["start_time"]
+    } for e in data]
+
+
+def events_from_json(data):
+    for e in data:
+        if isinstance(e["start_time"], str):
+            e["start_time"] = datetime.fromisoformat(e["start_time"])
+    return data
+
+
+def commit_github_events(state, data, retries=5):
+    """Write the event list with compare-and-swap, refetching and merging if
+    another writer got there first.
+
+    Stored events this replica has never seen (an offline import, say) are
+    kept after its own; ones it has seen and since changed are replaced.
+    Returns the kept events, or None if the list couldn't be written.
+    """
+    path = state.config["events_file"]
+    local = {stored_form(e) for e in data}
+    try:
+        for _ in range(retries):
+            remote, sha = fetch_github_file(path, kind="write")
+            added = [
+                e for e in events_from_json(remote or [])
+                if stored_form(e) not in local
+                and stored_form(e) not in state.events_stored
+            ]
+            merged = data + added
+            if put_github_file(path, events_json(merged), sha, "Update events"):
+                state.events_stored = {stored_form(e) for e in merged}
+                return added
+    except RuntimeError as e:
+        print(f"❌ {e}")
+    print(f"❌ Couldn't write events for guild {state.guild_id}.")
+    return None
+
+
+def load_events(state, kind="read"):
+    return events_from_json(fetch_github_events(state, kind))
+
+
+async def save_events(state):
+    bump_events_version(state)
+    if not leading():
+        print(f"⚠️ Not the leader, skipping events write for guild {state.guild_id}.")
+        return
+    if not state.events_loaded:
+        # Writing now would replace the stored events with a partial list
+        print(f"⚠️ Events for guild {state.guild_id} aren't loaded yet, skipping write.")
+        return
+    async with state.events_lock:  # A poll started now will see this write
+        added = await asyncio.to_thread(commit_github_events, state,
+                                        list(state.events))
+        if added:
+            # Written by someone else since our last read; the next poll
+            # schedules them
+            state.events.extend(added)
+            bump_events_version(state)
+            state.name_index.sync(state.events)
+
+
+def load_ledger(state):
+    data, _ = fetch_github_file(state.config["ledger_file"])
+    ledger = ParticipationLedger(data)
+    # Announcements posted while the ledger wasn't loaded yet
+    for event in state.events:
+        if event.get("message_id") and isinstance(event["start_time"],
+                                                  datetime):
+            ledger.track(event["message_id"], ledger_meta(event))
+    return ledger
+
+
+async def flush_ledger(state):
+    ledger = state.ledger
+    if ledger is None or not ledger.dirty or not leading():
+        return
+    ledger.dirty = False
+    if not await asyncio.to_thread(commit_github_file, state.config["ledger_file"],
+                                   ledger.to_json(), "Update participation ledger"):
+        ledger.dirty = True  # Try again on the next pass
+
+
+
+class Storage(commands.Cog):
+    """Reads and writes the data repo. Other extensions reach these helpers
+    through bot.get_cog("Storage"), so they always call the loaded version."""
+
+    fetch_github_file = staticmethod(fetch_github_file)
+    put_github_file = staticmethod(put_github_file)
+    commit_github_file = staticmethod(commit_github_file)
+    load_events = staticmethod(load_events)
+    save_events = staticmethod(save_events)
+    load_ledger = staticmethod(load_ledger)
+    flush_ledger = staticmethod(flush_ledger)
+    save_timezone = staticmethod(save_timezone)
+
+    @staticmethod
+    def lease_ttl():
+        """How long leadership can go unclaimed after a leader dies."""
+        return LEASE_TTL
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.lease_task = None
+
+    async def cog_load(self):
+        if self.bot.is_ready():  # Reloaded: on_ready won't fire again
+            self.start_lease()
+
+    async def cog_unload(self):
+        # The lease itself (core.leader_until) is kept, so a reload doesn't
+        # hand leadership to another replica
+        if self.lease_task:
+            self.lease_task.cancel()
+
+    def start_lease(self):
+        if self.lease_task is None or self.lease_task.done():
+            self.lease_task = self.bot.loop.create_task(hold_lease())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.start_lease()
+
+    @commands.Cog.listener()
+    async def on_leadership_change(self, leader):
+        if not leader:
+            return
+        # As a follower this replica's copies may have gone stale; refresh them
+        # before it writes either file
+        try:
+            configs = await asyncio.to_thread(load_guild_configs)
+            timezones = await asyncio.to_thread(load_timezones)
+        except RuntimeError as e:
+            print(f"❌ Couldn't refresh configs after taking the lease: {e}")
+            return
+        user_timezones.update(timezones)
+        for guild_id in merge_guild_configs(configs):
+            self.bot.dispatch("guild_configured", guild_state(guild_id))
+
+    @app_commands.command(
+        name="guildconfig",
+        description="Configure the roles and links this bot uses in this server")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_guild=True)
+    @leader_only()
+    @app_commands.describe(
+        staff_role="Role allowed to run staff commands (added to the list)",
+        notifier_role="Role pinged by /eventping",
+        participant_role="Role given to users who join an event",
+        announce_role="Role pinged above every event announcement",
+        help_channel_url="Link shown in /end for questions",
+        events_channel_url="Link shown in /end for future events")
+    async def guildconfig(self, interaction: discord.Interaction,
+                                staff_role: discord.Role = None,
+                                notifier_role: discord.Role = None,
+                                participant_role: discord.Role = None,
+                                announce_role: discord.Role = None,
+                                help_channel_url: str = None,
+                                events_channel_url: str = None):
+        await interaction.response.defer(ephemeral=True)
+        guild_id = interaction.guild_id
+
+        def apply(config):
+            # Applied to the stored config, so another replica's edits are kept
+            if staff_role and staff_role.id not in config["staff_role_ids"]:
+                config["staff_role_ids"].append(staff_role.id)
+            if notifier_role:
+                config["notifier_role_id"] = notifier_role.id
+            if participant_role:
+                config["participant_role_id"] = participant_role.id
+            if announce_role:
+                config["announce_role_id"] = announce_role.id
+            if help_channel_url is not None:
+                config["help_channel_url"] = help_channel_url or None
+            if events_channel_url is not None:
+                config["events_channel_url"] = events_channel_url or None
+
+        configs = await asyncio.to_thread(save_guild_config, guild_id, apply)
+        if configs is None:
+            await interaction.followup.send(
+                "❌ Couldn't save the configuration, please try again.",
+                ephemeral=True)
+            return
+        for other_id in merge_guild_configs(configs) - {guild_id}:
+            self.bot.dispatch("guild_configured", guild_state(other_id))
+        self.bot.dispatch("guild_configured", guild_state(guild_id))
+        config = guild_configs[guild_id]
+
+        summary = "\n".join(f"**{key}**: {value}" for key, value in config.items())
+        await interaction.followup.send(f"✅ Server configuration saved.\n{summary}",
+                                        ephemeral=True)
+
+
+
+async def setup(client):
+    global bot
+    bot = client
+    core.lease_backend = make_lease_backend()
+    if not core.storage_loaded:  # Already loaded if this is a reload
+        guild_configs.update(load_guild_configs())
+        user_timezones.update(load_timezones())
+        core.storage_loaded = True
+    await bot.add_cog(Storage(bot))
@@ -0,0 +1,872 @@
+"""State and helpers shared by the bot's extensions.
+
+This module is never reloaded. Everything that must outlive a /reload lives
+here: guild configs and per-guild state (events, caches, scheduled tasks,
+ledgers), the lease and rate-limit bookkeeping, and the classes whose
+instances are held in that state. The extensions in cogs/ only hold code.
+"""
+import discord
+from discord import app_commands
+import os
+import re
+import json
+import sys
+import logging
+import traceback
+import collections
+import array
+import bisect
+import heapq
+import time
+import asyncio
+import functools
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+from threading import Lock, Thread, get_ident
+
+# Set BOT_SHARDED=1 to run one process across many guilds with automatic sharding
+SHARDED = os.getenv("BOT_SHARDED") == "1"
+
+# Set LEAN_MEMBER_CACHE=1 to skip caching guild members. Participant role
+# holders are then tracked as a set of user IDs per guild instead.
+LEAN_MEMBERS = os.getenv("LEAN_MEMBER_CACHE") == "1"
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def staff_only():
+
+    async def predicate(interaction: discord.Interaction) -> bool:
+        if not isinstance(interaction.user, discord.Member):
+            return False
+        config = guild_configs.get(interaction.guild_id)
+        if config is None:
+            return False
+        staff_role_ids = set(config["staff_role_ids"])
+        return any(role.id in staff_role_ids
+                   for role in interaction.user.roles)
+
+    return app_commands.check(predicate)
+
+
+class NotLeader(app_commands.CheckFailure):
+    """Raised on follower replicas, which leave the command to the leader."""
+
+
+def leader_only():
+    """Every replica receives each interaction, so only the leader answers."""
+
+    async def predicate(interaction: discord.Interaction) -> bool:
+        if not leading():
+            raise NotLeader()
+        return True
+
+    return app_commands.check(predicate)
+
+
+def leader_autocomplete(callback):
+    """leader_only for autocomplete callbacks. Followers raise rather than
+    return no choices, since the first replica to respond wins."""
+
+    @functools.wraps(callback)
+    async def wrapper(interaction, current):
+        if not leading():
+            raise NotLeader()
+        return await callback(interaction, current)
+
+    return wrapper
+
+
+class IgnoreNotLeader(logging.Filter):
+    """Keep the NotLeader raised by followers' autocompletes out of the log."""
+
+    def filter(self, record):
+        return not (record.exc_info
+                    and isinstance(record.exc_info[1], NotLeader))
+
+
+logging.getLogger("discord.app_commands.tree").addFilter(IgnoreNotLeader())
+
+
+def storage(bot):
+    """The Storage cog, looked up on each call so a reloaded version takes effect."""
+    return bot.get_cog("Storage")
+
+
+# --- EVENT LOOP MONITOR ---
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", 0.25))  # Seconds
+LOOP_PROBE_INTERVAL = 0.5
+
+
+class LoopMonitor:
+    """Measures event-loop lag and records what was running whenever the loop stalls.
+
+    A probe coroutine timestamps every wake-up. A watchdog thread notices when
+    that timestamp goes stale and samples the loop thread's stack and current
+    task, so a blocking call is caught while it is still blocking.
+    """
+
+    def __init__(self, threshold=LOOP_SLOW_THRESHOLD,
+                 interval=LOOP_PROBE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.lock = Lock()
+        self.loop = None
+        self.thread_id = None
+        self.heartbeat = time.monotonic()
+        self.lags = collections.deque(maxlen=1200)  # Last ~10 minutes of probes
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.slow_callbacks = 0
+        self.offenders = {}  # site -> {"task", "count", "worst", "total", "stack"}
+        self.stall = None  # [site, seconds behind] for the stall in progress
+
+    def start(self, loop):
+        if self.loop is not None:
+            return
+        self.loop = loop
+        self.thread_id = get_ident()
+        # asyncio only reports slow callbacks in debug mode, which adds overhead
+        loop.slow_callback_duration = self.threshold
+        if os.getenv("LOOP_DEBUG") == "1":
+            loop.set_debug(True)
+            logging.getLogger("asyncio").addHandler(SlowCallbackHandler(self))
+        loop.create_task(self.probe())
+        Thread(target=self.watch, daemon=True).start()
+        print(f"🩺 Loop monitor started (stall threshold {self.threshold}s)")
+
+    async def probe(self):
+        while True:
+            self.heartbeat = time.monotonic()
+            started = self.loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self.loop.time() - started - self.interval)
+            with self.lock:
+                self.lags.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+
+    def watch(self):
+        while True:
+            time.sleep(self.threshold / 2)
+            behind = time.monotonic() - self.heartbeat - self.interval
+            with self.lock:
+                if behind < self.threshold:
+                    if self.stall:
+                        self.offenders[self.stall[0]]["total"] += self.stall[1]
+                        self.stall = None
+                    continue
+                if self.stall is None:
+                    self.stalls += 1
+                    self.stall = [self.sample(), behind]
+                self.stall[1] = behind
+                offender = self.offenders[self.stall[0]]
+                offender["worst"] = max(offender["worst"], behind)
+
+    def sample(self):
+        """Record the loop thread's current stack and task; returns the offender site."""
+        frame = sys._current_frames().get(self.thread_id)
+        frames = traceback.extract_stack(frame)[-8:] if frame else []
+        ours = [f for f in frames if f.filename.startswith(SOURCE_DIR)]
+        top = (ours or frames or [None])[-1]
+        site = f"{top.name} (line {top.lineno})" if top else "<unknown>"
+        task = asyncio.current_task(self.loop)
+        self.record(site, task.get_coro().__qualname__ if task else "<callback>",
+                    "".join(traceback.format_list(frames)))
+        return site
+
+    def record(self, site, task, stack, duration=0.0):
+        offender = self.offenders.setdefault(site, {
+            "task": task,
+            "count": 0,
+            "worst": 0.0,
+            "total": 0.0,
+            "stack": stack
+        })
+        offender["count"] += 1
+        offender["worst"] = max(offender["worst"], duration)
+        offender["total"] += duration
+
+    def record_slow_callback(self, handle, duration):
+        with self.lock:
+            self.slow_callbacks += 1
+            coro = re.search(r"coro=<([\w.]+)", handle)
+            site = f"{coro.group(1)} (callback)" if coro else clip(handle, 80)
+            self.record(site, "<slow callback>", "", duration)
+
+    def percentile(self, lags, q):
+        return lags[min(len(lags) - 1, int(q * len(lags)))] if lags else 0.0
+
+    def summary(self):
+        with self.lock:
+            lags = sorted(self.lags)
+            worst = sorted(self.offenders.items(),
+                           key=lambda kv: kv[1]["worst"],
+                           reverse=True)[:5]
+            return {
+                "p50": self.percentile(lags, 0.5),
+                "p99": self.percentile(lags, 0.99),
+                "max": self.max_lag,
+                "stalls": self.stalls,
+                "slow_callbacks": self.slow_callbacks,
+                "worst": [(site, dict(offender)) for site, offender in worst]
+            }
+
+    def metrics(self):
+        summary = self.summary()
+        return [
+            f'event_loop_lag_seconds{{quantile="0.5"}} {summary["p50"]:.4f}',
+            f'event_loop_lag_seconds{{quantile="0.99"}} {summary["p99"]:.4f}',
+            f"event_loop_lag_max_seconds {summary['max']:.4f}",
+            f"event_loop_stalls_total {summary['stalls']}",
+            f"event_loop_slow_callbacks_total {summary['slow_callbacks']}",
+        ] + [
+            f'event_loop_stall_worst_seconds{{site="{site.replace(chr(34), chr(39))}"}} {offender["worst"]:.3f}'
+            for site, offender in summary["worst"]
+        ]
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Feeds asyncio's "Executing ... took N seconds" warnings to the monitor."""
+
+    def __init__(self, monitor):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record):
+        if record.msg.startswith("Executing") and len(record.args) == 2:
+            self.monitor.record_slow_callback(str(record.args[0]),
+                                              record.args[1])
+
+
+loop_monitor = LoopMonitor()
+
+
+# --- GITHUB RATE LIMIT BUDGET ---
+# Every fetch and commit spends from one token's hourly quota. Background polls
+# only spend what's above the write reserve, and unchanged files are revalidated
+# with ETags, which GitHub answers with a 304 that doesn't count against it.
+POLL_MIN_INTERVAL = 15
+POLL_BASE_INTERVAL = 30
+POLL_MAX_INTERVAL = 300
+WRITE_RESERVE = 0.1  # Share of the quota kept back for writes and commands
+
+
+class RateLimitBudget:
+    """Shared view of the token's rate limit, fed from X-RateLimit-* headers.
+
+    Used from worker threads, so all state is guarded by a lock.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.limit = 5000
+        self.remaining = 5000
+        self.reset_at = 0.0
+        self.requests = {}  # kind ("poll", "read", "write", "lease") -> count
+        self.not_modified = 0
+        self.polls_skipped = 0
+        self.intervals = {}  # guild id -> current poll interval
+
+    def observe(self, response, kind):
+        headers = response.headers
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            if response.status_code == 304:
+                self.not_modified += 1
+            if "X-RateLimit-Remaining" in headers:
+                self.limit = int(headers.get("X-RateLimit-Limit", self.limit))
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                self.reset_at = float(
+                    headers.get("X-RateLimit-Reset", self.reset_at))
+        if response.status_code in (403, 429) and self.remaining == 0:
+            print(f"❌ GitHub rate limit exhausted until {time.ctime(self.reset_at)}")
+
+    def spare(self):
+        """Requests left above the write reserve until the quota resets."""
+        if time.time() >= self.reset_at:
+            return self.limit * (1 - WRITE_RESERVE)
+        return self.remaining - self.limit * WRITE_RESERVE
+
+    def allow_poll(self):
+        with self.lock:
+            if self.spare() > 0:
+                return True
+            self.polls_skipped += 1
+            return False
+
+    def next_interval(self, guild_id, changed):
+        """Seconds until a guild's next poll.
+
+        A change halves the interval and a quiet poll stretches it by half,
+        but never so short that all guilds' polls would outrun the budget.
+        """
+        with self.lock:
+            current = self.intervals.get(guild_id, POLL_BASE_INTERVAL)
+            wanted = current / 2 if changed else current * 1.5
+            wanted = min(max(wanted, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL)
+            window = max(0.0, self.reset_at - time.time())
+            spare = self.spare()
+            pollers = max(1, len(self.intervals))
+            floor = window * pollers / spare if spare > 0 else window
+            interval = max(wanted, floor)
+            self.intervals[guild_id] = interval
+            return interval
+
+    def metrics(self):
+        with self.lock:
+            lines = [
+                f"github_ratelimit_limit {self.limit}",
+                f"github_ratelimit_remaining {self.remaining}",
+                f"github_ratelimit_reset_seconds {max(0.0, self.reset_at - time.time()):.0f}",
+                f"github_not_modified_total {self.not_modified}",
+                f"github_polls_skipped_total {self.polls_skipped}",
+            ]
+            lines += [
+                f'github_requests_total{{kind="{kind}"}} {count}'
+                for kind, count in sorted(self.requests.items())
+            ]
+            lines += [
+                f'event_sync_interval_seconds{{guild="{guild_id}"}} {interval:.1f}'
+                for guild_id, interval in sorted(self.intervals.items())
+            ]
+        return lines
+
+
+github_budget = RateLimitBudget()
+github_etags = {}  # path -> (ETag, decoded text, blob SHA) of the last 200 response
+
+
+# --- GUILD CONFIG ---
+DEFAULT_GUILD_CONFIG = {
+    "staff_role_ids": [],
+    "notifier_role_id": None,
+    "participant_role_id": None,
+    "announce_role_id": None,  # Role pinged above every announcement
+    "help_channel_url": None,
+    "events_channel_url": None,
+}
+
+
+def with_defaults(guild_id, config):
+    return {
+        **DEFAULT_GUILD_CONFIG,
+        "events_file": f"events/{guild_id}.json",
+        "planner_file": f"eventplanner/{guild_id}.json",
+        "ledger_file": f"participation/{guild_id}.json",
+        **config,
+        # A fresh list per guild, so appending a role can't leak into the others
+        "staff_role_ids": list(config.get("staff_role_ids", [])),
+    }
+
+
+guild_configs = {}  # guild id -> config, loaded by the storage extension
+storage_loaded = False  # Set once guild_configs and user_timezones have been read
+
+
+# --- LEADER LEASE ---
+# The backend is picked by the storage extension (see cogs/storage.py), which
+# also renews the lease. None means a single replica that always leads.
+lease_backend = None
+leader_until = 0.0  # Wall-clock time our current lease runs out
+
+
+def leading():
+    """True if this replica may schedule announcements and write to storage."""
+    return lease_backend is None or time.time() < leader_until
+
+
+class GuildState:
+    """Events, caches and scheduler state for one guild.
+
+    Each guild gets its own instance, sync loop and locks, so a busy guild's
+    work never waits on another's.
+    """
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.events = []
+        self.events_loaded = False  # Set once the list has been read from storage
+        self.events_version = 0  # Bumped whenever the in-memory event list changes
+        self.events_lock = asyncio.Lock()  # Held by event writes and by the poll's fetch
+        self.events_stored = set()  # stored_form() of each event as last read or written
+        self.scheduled_tasks = {}  # Stores asyncio tasks for events
+        self.render_cache = {}  # view name -> (version, expires_at, embeds)
+        self.upcoming_index = {"version": None, "all": [], "by_creator": {}}
+        self.name_index = EventNameIndex()
+        self.planner_version = 0  # Bumped whenever the fetched or committed schedule changes
+        self.planner_snapshot = None
+        self.planner_cache = {
+            "schedule": None,
+            "sha": None,
+            "fetched_at": 0.0,
+            "month": None
+        }
+        self.planner_index = {"version": None, "months": [], "weeks": {}}
+        self.planner_locks = {}  # (month key, week number) -> asyncio.Lock
+        self.participant_ids = set()  # Participant role holders (lean member mode)
+        self.participants_role_id = None  # The role participant_ids was scanned for
+        self.ledger = None  # ParticipationLedger, loaded by the sync loop
+        self.ledger_ready = asyncio.Event()
+        self.role_ops = {}  # user id -> True to add / False to remove the Participant role
+        self.role_worker = None
+        self.sync_task = None
+
+    @property
+    def config(self):
+        return guild_configs[self.guild_id]
+
+
+guild_states = {}
+
+
+def guild_state(guild_id):
+    """Return the state for a configured guild, or None if it isn't set up."""
+    if guild_id not in guild_configs:
+        return None
+    if guild_id not in guild_states:
+        guild_states[guild_id] = GuildState(guild_id)
+    return guild_states[guild_id]
+
+
+async def require_state(interaction):
+    state = guild_state(interaction.guild_id)
+    if state is None:
+        await interaction.response.send_message(
+            "❌ This server hasn't been set up yet. Ask an admin to run /guildconfig.",
+            ephemeral=True)
+    return state
+
+
+async def require_events(interaction):
+    """require_state for commands that add events, which mustn't run before
+    the stored list has been read (its first save would replace it)."""
+    state = await require_state(interaction)
+    if state is not None and not state.events_loaded:
+        await interaction.response.send_message(
+            "⏳ This server's events are still loading, try again shortly.",
+            ephemeral=True)
+        return None
+    return state
+
+
+def participant_role(guild):
+    config = guild_configs.get(guild.id)
+    if config and config["participant_role_id"]:
+        role = guild.get_role(config["participant_role_id"])
+        if role:
+            return role
+    return discord.utils.get(guild.roles, name="Participant")
+
+
+# /deleteevent moves an event's start here rather than removing it from the list
+DELETED_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def set_events(state, new_events):
+    """Replace the in-memory event list, invalidating caches only if it changed.
+
+    Returns True if it changed.
+    """
+    changed = new_events != state.events
+    if changed:
+        bump_events_version(state)
+        state.name_index.sync(new_events)
+    state.events = new_events
+    state.events_stored = {stored_form(e) for e in new_events}
+    return changed
+
+
+def stored_form(event):
+    """An event serialized as it is in the events file, for comparing with stored copies."""
+    return json.dumps(event, sort_keys=True, default=datetime.isoformat)
+
+
+def bump_events_version(state):
+    state.events_version += 1
+
+
+# --- START TIMES ---
+DURATION_PART = re.compile(r"(\d+)\s*([wdhms])", re.IGNORECASE)
+DURATION = re.compile(r"(?:\s*\d+\s*[wdhms])+\s*", re.IGNORECASE)
+DISCORD_TIMESTAMP = re.compile(r"<t:(-?\d+)(?::[tTdDfFR])?>")
+TIME_OF_DAY = re.compile(r"(\d{1,2}):(\d{2})")
+START_TIME_HELP = (
+    "Use a delay like 30m or 1d2h30m, a date and time like 2025-06-01 19:00, "
+    "a time of day like 19:30, or a <t:…> timestamp.")
+
+user_timezones = {}  # user id -> IANA zone name, loaded by the storage extension
+
+
+@functools.lru_cache(maxsize=None)
+def load_zone(name):
+    """ZoneInfo for an IANA name, memoized so each zone's rules are parsed once."""
+    return ZoneInfo(name)
+
+
+@functools.lru_cache(maxsize=1)
+def timezone_names():
+    """Sorted IANA zone names, scanned from the tz database once for autocomplete."""
+    return sorted(available_timezones())
+
+
+def user_zone(user_id):
+    """The zone a user's typed start times are read in; UTC until they set one."""
+    name = user_timezones.get(user_id)
+    if name:
+        try:
+            return load_zone(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.utc
+
+
+def parse_start_time(text, tz=timezone.utc, now=None):
+    """Parse a start time as typed by a user into an aware UTC datetime.
+
+    Delays count from now; their days and weeks follow the calendar in tz, so
+    "1d" keeps the wall-clock time across a DST change. Dates and times
+    without an offset, and bare times of day (the next one to come), are read
+    in tz. Raises ValueError with START_TIME_HELP if nothing matches.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    text = text.strip()
+    try:
+        if DURATION.fullmatch(text):
+            amounts = dict.fromkeys("wdhms", 0)
+            for value, unit in DURATION_PART.findall(text):
+                amounts[unit.lower()] += int(value)
+            local = now.astimezone(tz) + timedelta(weeks=amounts["w"],
+                                                   days=amounts["d"])
+            return local.astimezone(timezone.utc) + timedelta(
+                hours=amounts["h"], minutes=amounts["m"], seconds=amounts["s"])
+
+        match = DISCORD_TIMESTAMP.fullmatch(text)
+        if match:
+            return datetime.fromtimestamp(int(match.group(1)), tz=timezone.utc)
+
+        match = TIME_OF_DAY.fullmatch(text)
+        if match:
+            local = now.astimezone(tz)
+            start = local.replace(hour=int(match.group(1)),
+                                  minute=int(match.group(2)),
+                                  second=0,
+                                  microsecond=0)
+            if start <= local:
+                start += timedelta(days=1)
+            return start.astimezone(timezone.utc)
+
+        start = datetime.fromisoformat(text)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(START_TIME_HELP) from None
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=tz)
+    return start.astimezone(timezone.utc)
+
+
+def format_local(start, tz):
+    """A start time as it would be typed back in: local date and time in tz."""
+    return f"{start.astimezone(tz):%Y-%m-%d %H:%M}"
+
+
+# --- EMBED RENDERING ---
+# Discord rejects embeds over these limits, so long listings are split into pages.
+EMBED_MAX_FIELDS = 25
+EMBED_MAX_CHARS = 6000
+EMBED_FIELD_NAME_MAX = 256
+EMBED_FIELD_VALUE_MAX = 1024
+EMBED_DESCRIPTION_MAX = 4096
+
+
+def clip(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def paginate_embed(title, fields, color, description="", trailer=None):
+    """Split (name, value) fields over as many embeds as Discord's limits require.
+
+    The description is shown on the first page and the optional trailer field on the last.
+    """
+    description = clip(description, EMBED_DESCRIPTION_MAX)
+    fields = [(clip(name, EMBED_FIELD_NAME_MAX), clip(value, EMBED_FIELD_VALUE_MAX))
+              for name, value in fields]
+    if trailer:
+        fields.append((clip(trailer[0], EMBED_FIELD_NAME_MAX),
+                       clip(trailer[1], EMBED_FIELD_VALUE_MAX)))
+
+    pages = [[]]
+    used = len(title) + len(description)
+    for name, value in fields:
+        size = len(name) + len(value)
+        if pages[-1] and (len(pages[-1]) >= EMBED_MAX_FIELDS
+                          or used + size > EMBED_MAX_CHARS - 32):  # room for footer
+            pages.append([])
+            used = len(title)
+        pages[-1].append((name, value))
+        used += size
+
+    embeds = []
+    for number, page in enumerate(pages, start=1):
+        embed = discord.Embed(title=title,
+                              description=description if number == 1 else None,
+                              color=color)
+        for name, value in page:
+            embed.add_field(name=name, value=value, inline=False)
+        if len(pages) > 1:
+            embed.set_footer(text=f"Page {number}/{len(pages)}")
+        embeds.append(embed)
+    return embeds
+
+
+def cached_render(state, view, version, build):
+    """Return cached embeds for a view, rebuilding only when its data version changed
+    or the rendered content went stale (e.g. a listed event has since started)."""
+    now = datetime.now(tz=timezone.utc)
+    cached = state.render_cache.get(view)
+    if cached and cached[0] == version and (cached[1] is None
+                                            or now < cached[1]):
+        return cached[2]
+    embeds, expires_at = build(now)
+    state.render_cache[view] = (version, expires_at, embeds)
+    return embeds
+
+
+
+class EmbedPager(discord.ui.View):
+    """Previous/next buttons for flipping through a list of embed pages."""
+
+    def __init__(self, embeds):
+        super().__init__(timeout=180)
+        self.embeds = embeds
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = self.page >= len(self.embeds) - 1
+
+    async def show(self, interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.page],
+                                                view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        self.page -= 1
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        self.page += 1
+        await self.show(interaction)
+
+
+def pager_kwargs(embeds):
+    """Message kwargs for showing the first page, with buttons if there are more."""
+    if len(embeds) > 1:
+        return {"embed": embeds[0], "view": EmbedPager(embeds)}
+    return {"embed": embeds[0]}
+
+
+# --- EVENT NAME INDEX (autocomplete) ---
+class EventNameIndex:
+    """Per-creator prefix and trigram index over the names of unstarted events.
+
+    Kept up to date incrementally by create/edit/delete, and by a diff against
+    the previous list when the periodic sync brings in remote changes.
+    """
+
+    def __init__(self):
+        self.entries = {}  # event index -> (creator id, lowercased name)
+        self.sorted_names = {}  # creator id -> sorted [(name, event index)]
+        self.trigrams = {}  # (creator id, trigram) -> {event index}
+
+    @staticmethod
+    def grams(name):
+        return {name[i:i + 3] for i in range(len(name) - 2)}
+
+    @staticmethod
+    def entry_for(event):
+        start = event.get("start_time")
+        if (event.get("started") or not isinstance(start, datetime)
+                or start <= datetime.now(tz=timezone.utc)):
+            return None
+        return event["creator"]["id"], event["name"].lower()
+
+    def add(self, index, event):
+        self.remove(index)
+        entry = self.entry_for(event)
+        if entry is None:
+            return
+        creator_id, name = entry
+        self.entries[index] = entry
+        bisect.insort(self.sorted_names.setdefault(creator_id, []),
+                      (name, index))
+        for gram in self.grams(name):
+            self.trigrams.setdefault((creator_id, gram), set()).add(index)
+
+    def remove(self, index):
+        entry = self.entries.pop(index, None)
+        if entry is None:
+            return
+        creator_id, name = entry
+        names = self.sorted_names[creator_id]
+        del names[bisect.bisect_left(names, (name, index))]
+        for gram in self.grams(name):
+            bucket = self.trigrams[(creator_id, gram)]
+            bucket.discard(index)
+            if not bucket:
+                del self.trigrams[(creator_id, gram)]
+
+    def sync(self, new_events):
+        for index, event in enumerate(new_events):
+            if self.entries.get(index) != self.entry_for(event):
+                self.add(index, event)
+        for index in [i for i in self.entries if i >= len(new_events)]:
+            self.remove(index)
+
+    def search(self, creator_id, query, limit=25):
+        """Return event indices for creator_id whose names match query.
+
+        Prefix matches come first; queries of 3+ characters also match anywhere
+        in the name through the trigram sets.
+        """
+        query = query.lower().strip()
+        names = self.sorted_names.get(creator_id, [])
+        start = bisect.bisect_left(names, (query, -1))
+        results = []
+        for name, index in names[start:]:
+            if not name.startswith(query) or len(results) >= limit:
+                break
+            results.append(index)
+
+        if len(query) >= 3 and len(results) < limit:
+            buckets = sorted((self.trigrams.get((creator_id, gram), set())
+                              for gram in self.grams(query)),
+                             key=len)
+            matches = set.intersection(*buckets) if buckets else set()
+            for index in sorted(matches):
+                if len(results) >= limit:
+                    break
+                if index not in results and query in self.entries[index][1]:
+                    results.append(index)
+        return results
+
+
+# --- PARTICIPATION LEDGER ---
+class ParticipationLedger:
+    """Who joined which announced event, keyed by announcement message ID.
+
+    Each event keeps a sorted array of participant IDs. Per-day and per-creator
+    counters are updated on every join and leave, so the analytics commands
+    never rescan the archive.
+    """
+
+    def __init__(self, data=None):
+        self.events = {}  # message id -> {"name", "creator_id", "creator_name", "day"}
+        self.participants = {}  # message id -> sorted array of user IDs
+        self.recent = []  # sorted (ISO day, message id), for autocomplete
+        self.days = []  # sorted ISO days with a tracked event
+        self.day_counts = {}  # ISO day -> {user id: joins}
+        self.creator_counts = {}  # creator id -> {user id: joins}
+        self.creator_joins = {}  # creator id -> total joins
+        self.creator_events = {}  # creator id -> events hosted
+        for message_id, entry in (data or {}).items():
+            message_id = int(message_id)
+            self.track(message_id, {
+                key: entry[key]
+                for key in ("name", "creator_id", "creator_name", "day")
+            })
+            for user_id in entry["participants"]:
+                self.join(message_id, user_id)
+        self.dirty = False
+
+    def track(self, message_id, meta):
+        if message_id in self.events:
+            return
+        self.events[message_id] = meta
+        self.participants[message_id] = array.array("Q")
+        bisect.insort(self.recent, (meta["day"], message_id))
+        if meta["day"] not in self.day_counts:
+            bisect.insort(self.days, meta["day"])
+            self.day_counts[meta["day"]] = {}
+        creator_id = meta["creator_id"]
+        self.creator_events[creator_id] = self.creator_events.get(creator_id,
+                                                                  0) + 1
+        self.dirty = True
+
+    def join(self, message_id, user_id):
+        ids = self.participants[message_id]
+        i = bisect.bisect_left(ids, user_id)
+        if i < len(ids) and ids[i] == user_id:
+            return False
+        ids.insert(i, user_id)
+        self.count(self.events[message_id], user_id, 1)
+        return True
+
+    def leave(self, message_id, user_id):
+        ids = self.participants[message_id]
+        i = bisect.bisect_left(ids, user_id)
+        if i == len(ids) or ids[i] != user_id:
+            return False
+        del ids[i]
+        self.count(self.events[message_id], user_id, -1)
+        return True
+
+    def count(self, meta, user_id, delta):
+        for counts in (self.day_counts[meta["day"]],
+                       self.creator_counts.setdefault(meta["creator_id"], {})):
+            counts[user_id] = counts.get(user_id, 0) + delta
+            if not counts[user_id]:
+                del counts[user_id]
+        creator_id = meta["creator_id"]
+        self.creator_joins[creator_id] = self.creator_joins.get(creator_id,
+                                                                0) + delta
+        self.dirty = True
+
+    def top(self, start, end, limit=10):
+        """Return the [(user id, joins)] with most joins on events from start to end (ISO days)."""
+        totals = {}
+        first = bisect.bisect_left(self.days, start)
+        last = bisect.bisect_right(self.days, end)
+        for day in self.days[first:last]:
+            for user_id, joins in self.day_counts[day].items():
+                totals[user_id] = totals.get(user_id, 0) + joins
+        return heapq.nlargest(limit, totals.items(), key=lambda kv: kv[1])
+
+    def creator_stats(self, creator_id):
+        counts = self.creator_counts.get(creator_id, {})
+        return {
+            "events": self.creator_events.get(creator_id, 0),
+            "joins": self.creator_joins.get(creator_id, 0),
+            "unique": len(counts),
+            "regulars": heapq.nlargest(5, counts.items(), key=lambda kv: kv[1])
+        }
+
+    def search(self, query, limit=25):
+        """Return message IDs of events whose names contain query, newest first."""
+        query = query.lower().strip()
+        results = []
+        for _, message_id in reversed(self.recent):
+            if query in self.events[message_id]["name"].lower():
+                results.append(message_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def to_json(self):
+        return {
+            str(message_id): {
+                **meta, "participants": self.participants[message_id].tolist()
+            }
+            for message_id, meta in self.events.items()
+        }
+
+
+def ledger_meta(event):
+    return {
+        "name": event["name"],
+        "creator_id": event["creator"]["id"],
+        "creator_name": event["creator"]["name"],
+        "day": event["start_time"].date().isoformat()
+    }